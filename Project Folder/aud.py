@@ -1,33 +1,55 @@
-from moviepy import VideoFileClip
+import time
+import media
+import perf
 
+@perf.instrument("extract_audio_from_video")
 def extract_audio_from_video(video_path = "vid.mp4", audio_path="aud.wav"):
+    """
+    Extract the audio of a video to a 16-bit PCM WAV file with ffmpeg.
+    Only the audio stream is decoded; returns audio_path, or None on failure.
+    """
     try:
-        # Load the video file using VideoFileClip
-        video_clip = VideoFileClip(video_path)
-        
-        # Check if the video clip has audio
-        if video_clip.audio is None:
-            print(f"Warning: The video file '{video_path}' does not contain any audio.")
-            video_clip.close()  # Close the video clip to release resources
-            return None # Exit the function
-        
-        # Extract the audio and save it to a file. Use .mp3 for compressed audio.
-        video_clip.audio.write_audiofile(audio_path, codec='libmp3lame')
+        media.run_ffmpeg(["-i", video_path, "-vn", "-map", "0:a:0", "-c:a", "pcm_s16le", audio_path])
+        perf.set_audio_seconds(media.probe_duration(audio_path))
         print(f"Audio extracted and saved to {audio_path}")
-        
-        return video_clip.audio
+        return audio_path
     except FileNotFoundError as e:
         print(f"File not found: {e}")
-    except OSError as e:
-        print(f"OS error: {e}")
-        # If it's related to ffmpeg, provide more detailed guidance
-        if "ffmpeg" in str(e).lower():
-            print("\nThis appears to be an ffmpeg-related error.")
-    except Exception as e:
-        print(f"An error occurred: {e}")
+    except RuntimeError as e:
+        # ffmpeg reports a video without audio as "matches no streams"
+        print(f"Could not extract audio from '{video_path}': {e}")
+
+@perf.instrument("extract_audio_from_video")
+def extract_audio_pcm(video_path, pcm_path, sample_rate=44100, channels=2):
+    """
+    Extract the audio of a video to a raw float32 PCM file and map it into memory.
+    Returns an AudioBuffer backed by the file, so long audio doesn't have to fit in RAM.
+    """
+    audio = media.decode_to_pcm_file(video_path, pcm_path, sample_rate, channels)
+    perf.set_audio_seconds(audio.duration)
+    return audio
+
+def iter_audio_chunks(video_path, sample_rate=44100, channels=2, chunk_seconds=30):
+    """
+    Decode the audio of a video chunk by chunk, yielding (channels, frames) float32 arrays
+    while ffmpeg is still decoding, so a consumer can start before extraction finishes.
+    The time spent waiting on ffmpeg is reported as the extract_audio_from_video stage.
+    """
+    frames = 0
+    waited = 0.0
+    chunks = media.iter_pcm(video_path, sample_rate, channels, int(chunk_seconds * sample_rate))
+    try:
+        while True:
+            start = time.perf_counter()
+            chunk = next(chunks, None)
+            waited += time.perf_counter() - start
+            if chunk is None:
+                break
+            frames += chunk.shape[1]
+            yield chunk
+        perf.set_audio_seconds(frames / sample_rate)
     finally:
-        # Ensure resources are released (though VideoFileClip's context manager should handle this)
-        if 'video_clip' in locals() and video_clip is not None:
-            video_clip.close()
+        chunks.close()
+        perf.record_stage("extract_audio_from_video", waited)
 
-# print(extract_audio_from_video("tempfile/vid.mp4", "tempfile/aud.wav"))
\ No newline at end of file
+# print(extract_audio_from_video("tempfile/vid.mp4", "tempfile/aud.wav"))
@@ -0,0 +1,105 @@
+import os
+import wave
+from dataclasses import dataclass
+import numpy as np
+
+@dataclass
+class AudioBuffer:
+    """
+    Float PCM audio, in memory or memory-mapped from a raw PCM file.
+    samples has shape (channels, frames) with values in [-1, 1].
+    """
+    samples: np.ndarray
+    sample_rate: int
+
+    @property
+    def channels(self) -> int:
+        return self.samples.shape[0]
+
+    @property
+    def duration(self) -> float:
+        return self.samples.shape[1] / self.sample_rate
+
+    def to_mono(self) -> "AudioBuffer":
+        """Downmix to a single channel"""
+        if self.channels == 1:
+            return self
+        return AudioBuffer(self.samples.mean(axis=0, keepdims=True), self.sample_rate)
+
+    def resample(self, sample_rate: int) -> "AudioBuffer":
+        """Resample to a new sample rate"""
+        if sample_rate == self.sample_rate:
+            return self
+        # Imported lazily so that stages which never resample don't pay for torch
+        import torch
+        import torchaudio.functional as F
+        resampled = F.resample(torch.from_numpy(np.ascontiguousarray(self.samples)), self.sample_rate, sample_rate)
+        return AudioBuffer(resampled.numpy(), sample_rate)
+
+    def save_wav(self, file_path: str):
+        """Write the buffer as a 16-bit PCM WAV file"""
+        write_wav(file_path, self.samples, self.sample_rate)
+
+    def to_audio_segment(self):
+        """Convert to a 16-bit pydub AudioSegment"""
+        from pydub import AudioSegment
+        pcm = (np.clip(self.samples, -1.0, 1.0) * 32767).astype(np.int16)
+        return AudioSegment(data=pcm.T.tobytes(), sample_width=2, frame_rate=self.sample_rate, channels=self.channels)
+
+def from_audio_segment(segment) -> AudioBuffer:
+    """Convert a pydub AudioSegment to an AudioBuffer"""
+    segment = segment.set_sample_width(2)
+    data = np.array(segment.get_array_of_samples(), dtype=np.int16)
+    samples = data.reshape(-1, segment.channels).T.astype(np.float32) / 32768.0
+    return AudioBuffer(samples, segment.frame_rate)
+
+def write_wav(file_path: str, samples: np.ndarray, sample_rate: int):
+    """Write (channels, frames) float samples to a 16-bit PCM WAV file"""
+    directory = os.path.dirname(file_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+    with wave.open(file_path, 'wb') as wf:
+        wf.setnchannels(pcm.shape[0])
+        wf.setsampwidth(2)
+        wf.setframerate(sample_rate)
+        wf.writeframes(pcm.T.tobytes())
+
+def open_wav_memmap(file_path: str, mode: str = "r+"):
+    """
+    Map the samples of a 16-bit PCM WAV file written by this module into memory.
+    Returns (int16 array of shape (frames, channels), sample_rate); with mode "r+"
+    writes to the array patch the file in place.
+    """
+    with wave.open(file_path, 'rb') as wf:
+        channels, rate, frames = wf.getnchannels(), wf.getframerate(), wf.getnframes()
+        if wf.getsampwidth() != 2:
+            raise ValueError(f"{file_path} is not 16-bit PCM")
+    # The data chunk is the last one in the files we write
+    offset = os.path.getsize(file_path) - frames * channels * 2
+    return np.memmap(file_path, dtype="<i2", mode=mode, offset=offset, shape=(frames, channels)), rate
+
+class WavWriter:
+    """Incrementally write (channels, frames) float chunks to a 16-bit PCM WAV file"""
+
+    def __init__(self, file_path: str, sample_rate: int, channels: int):
+        directory = os.path.dirname(file_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._wf = wave.open(file_path, 'wb')
+        self._wf.setnchannels(channels)
+        self._wf.setsampwidth(2)
+        self._wf.setframerate(sample_rate)
+
+    def write(self, samples: np.ndarray):
+        pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16)
+        self._wf.writeframes(pcm.T.tobytes())
+
+    def close(self):
+        self._wf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,113 @@
+"""
+Dub many videos into many languages without prompts.
+
+The manifest is a JSON list of jobs (or a JSON Lines file with one job per line):
+    [{"source": "https://youtube.com/watch?v=...", "languages": ["hindi", "spanish"]},
+     {"id": "lecture-3", "source": "videos/lecture3.mp4", "languages": ["french"]}]
+
+Run:
+    python batch.py manifest.json --runs-dir runs --jobs 2 --cpu-slots 1 --io-slots 4
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import Manager
+
+def load_manifest(path):
+    """
+    Read jobs from a JSON list or a JSON Lines file.
+    Entries with the same id (by default, the same source) share a working directory,
+    so they are merged into one job with their languages combined.
+    """
+    with open(path) as f:
+        content = f.read().strip()
+    if content.startswith("["):
+        jobs = json.loads(content)
+    else:
+        jobs = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    merged = {}
+    for job in jobs:
+        if "source" not in job or not job.get("languages"):
+            raise ValueError(f"Manifest entries need a source and languages: {job}")
+        if isinstance(job["languages"], str):
+            job["languages"] = [job["languages"]]
+        job.setdefault("id", hashlib.sha1(job["source"].encode()).hexdigest()[:12])
+        if job["id"] not in merged:
+            merged[job["id"]] = job
+            continue
+        first = merged[job["id"]]
+        if first["source"] != job["source"]:
+            raise ValueError(f"Manifest id '{job['id']}' is used for both {first['source']} and {job['source']}")
+        first["languages"] += [language for language in job["languages"] if language not in first["languages"]]
+    return list(merged.values())
+
+def run_job(job, runs_dir, limits, model_size="medium", stream=False):
+    """
+    Run one manifest entry in its own working directory.
+    Languages run one after another in the same directory, so the download,
+    separation (including the music stem) and transcription are checkpointed by the
+    first language and skipped for the others.
+    """
+    # Imported in the worker process so the parent scheduler stays light
+    import main
+
+    workdir = os.path.join(runs_dir, job["id"])
+    results = {}
+    for translation_lan in job["languages"]:
+        language = main.get_language_code(translation_lan)
+        output = os.path.join(workdir, f"output_{language}.mp4")
+        start = time.time()
+        try:
+            pipeline = main.build_pipeline(job["source"], translation_lan.lower(), workdir, output, model_size, stream)
+            pipeline.run(limits=limits)
+            results[translation_lan] = {"ok": True, "output": output, "seconds": round(time.time() - start, 1)}
+        except Exception as e:
+            traceback.print_exc()
+            results[translation_lan] = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+    return job["id"], results
+
+def run_batch(jobs, runs_dir="runs", max_jobs=2, cpu_slots=1, io_slots=4, model_size="medium", stream=False):
+    """
+    Schedule jobs across a process pool.
+    At most cpu_slots CPU-heavy stages (Demucs, Whisper, encoding) and io_slots
+    I/O-bound stages (download, translation, TTS) run at once across all jobs.
+    """
+    os.makedirs(runs_dir, exist_ok=True)
+    summary = {}
+    with Manager() as manager:
+        limits = {"cpu": manager.BoundedSemaphore(cpu_slots), "io": manager.BoundedSemaphore(io_slots)}
+        with ProcessPoolExecutor(max_workers=max_jobs) as executor:
+            futures = {executor.submit(run_job, job, runs_dir, limits, model_size, stream): job for job in jobs}
+            for future in as_completed(futures):
+                job = futures[future]
+                try:
+                    job_id, results = future.result()
+                except Exception as e:
+                    job_id, results = job["id"], {"*": {"ok": False, "error": f"{type(e).__name__}: {e}"}}
+                summary[job_id] = results
+                print(f"📦 Finished job {job_id}: {json.dumps(results)}")
+
+    with open(os.path.join(runs_dir, "summary.json"), "w") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="JSON or JSON Lines file listing sources and target languages")
+    parser.add_argument("--runs-dir", default="runs", help="Each job gets its own directory in here")
+    parser.add_argument("--jobs", type=int, default=2, help="Videos processed at the same time")
+    parser.add_argument("--cpu-slots", type=int, default=1, help="CPU-heavy stages allowed to run at once")
+    parser.add_argument("--io-slots", type=int, default=4, help="I/O-bound stages allowed to run at once")
+    parser.add_argument("--model-size", default="medium", help="Whisper model size")
+    parser.add_argument("--stream", action="store_true", help="Overlap transcription, translation and dubbing")
+    args = parser.parse_args()
+
+    summary = run_batch(load_manifest(args.manifest), args.runs_dir, args.jobs, args.cpu_slots, args.io_slots,
+                        args.model_size, args.stream)
+    failed = sum(1 for results in summary.values() for result in results.values() if not result["ok"])
+    print(f"✅ Batch complete: {len(summary)} jobs, {failed} failures. Summary in {args.runs_dir}/summary.json")
@@ -0,0 +1,67 @@
+"""
+Benchmark and check yt_download.fetch against the local range server: one connection
+against several on a bandwidth-capped server, then an interrupted download resumed.
+
+Run from the project folder:
+    python benchmarks/fetch_bench.py --size-mb 64 --rate-mb 8 --connections 4
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import yt_download
+from range_server import serve
+
+def sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=64)
+    parser.add_argument("--rate-mb", type=float, default=8, help="Bandwidth cap per connection in MB/s")
+    parser.add_argument("--connections", type=int, default=4)
+    parser.add_argument("--chunk-mb", type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        source_dir = os.path.join(root, "cdn")
+        os.makedirs(source_dir)
+        source = os.path.join(source_dir, "media.bin")
+        with open(source, "wb") as f:
+            f.write(os.urandom(args.size_mb * 2 ** 20))
+        expected = sha256(source)
+        chunk = args.chunk_mb * 2 ** 20
+
+        server, base = serve(source_dir, rate=args.rate_mb * 2 ** 20)
+        url = f"{base}/media.bin"
+        for connections in (1, args.connections):
+            target = os.path.join(root, f"out_{connections}.bin")
+            start = time.perf_counter()
+            yt_download.fetch(url, target, connections=connections, chunk_size=chunk)
+            elapsed = time.perf_counter() - start
+            assert sha256(target) == expected, "downloaded file differs from the source"
+            print(f"⏱️ {connections} connection(s): {elapsed:.2f}s ({args.size_mb / elapsed:.1f} MB/s)")
+        server.shutdown()
+
+        # Interrupted download: a server that cuts off every fifth response stops the fetch
+        # part way, then a healthy server finishes the job from the saved progress
+        target = os.path.join(root, "resumed.bin")
+        flaky, base = serve(source_dir, fail_every=5)
+        try:
+            yt_download.fetch(f"{base}/media.bin", target, connections=args.connections,
+                              chunk_size=chunk, retries=0)
+        except OSError as e:
+            print(f"💥 Download interrupted as planned: {type(e).__name__}")
+        flaky.shutdown()
+
+        healthy, base = serve(source_dir)
+        yt_download.fetch(f"{base}/media.bin", target, connections=args.connections, chunk_size=chunk)
+        healthy.shutdown()
+        assert sha256(target) == expected, "resumed file differs from the source"
+        print("✅ Resumed download matches the source")
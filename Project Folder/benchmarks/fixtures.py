@@ -0,0 +1,78 @@
+"""
+Synthetic media for the benchmarks, generated with ffmpeg so nothing is downloaded.
+
+The "speech" is a gated tone (on for SPEECH_SECONDS, off for the rest of each
+SEGMENT_SECONDS period) and the "music" is low-level pink noise, mixed into one
+stereo track under an ffmpeg test pattern.
+
+make_speech_clip() is the exception: speech recognition needs real speech, so it
+synthesizes SPEECH_SCRIPT with gTTS once (network required) and keeps the clip.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import media
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".fixtures")
+
+# One fake utterance per SEGMENT_SECONDS, voiced for the first SPEECH_SECONDS of it
+SEGMENT_SECONDS = 4
+SPEECH_SECONDS = 3
+
+def make_video(minutes, output_dir=FIXTURE_DIR, size="320x240", fps=10, sample_rate=44100):
+    """Create (or reuse) a synthetic video of the given length and return its path"""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"synthetic_{minutes:g}m.mp4")
+    if os.path.exists(path):
+        return path
+
+    seconds = minutes * 60
+    speech = (f"aevalsrc='0.3*sin(2*PI*(180+40*sin(2*PI*3*t))*t)*lt(mod(t,{SEGMENT_SECONDS}),{SPEECH_SECONDS})'"
+              f":s={sample_rate}:d={seconds}")
+    music = f"anoisesrc=color=pink:amplitude=0.05:r={sample_rate}:d={seconds}"
+    print(f"🎞️ Generating {minutes:g} minute fixture {path}...")
+    tmp_path = path + ".tmp.mp4"
+    media.run_ffmpeg([
+        "-f", "lavfi", "-i", f"testsrc2=size={size}:rate={fps}:duration={seconds}",
+        "-f", "lavfi", "-i", speech,
+        "-f", "lavfi", "-i", music,
+        "-filter_complex", "[1:a][2:a]amix=inputs=2:normalize=0,pan=stereo|c0=c0|c1=c0[a]",
+        "-map", "0:v", "-map", "[a]",
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k",
+        tmp_path,
+    ])
+    os.replace(tmp_path, path)
+    return path
+
+# Read out for the speech clip; also the ground truth its transcripts are scored against
+SPEECH_SCRIPT = (
+    "The museum opens at nine in the morning and closes at six in the evening. "
+    "Tickets for the new exhibition can be bought at the front desk or online. "
+    "Please keep your bags in the lockers near the entrance. "
+    "Our guided tour starts every hour and lasts about forty minutes. "
+    "Photography is allowed in most rooms, but the use of flash is not permitted. "
+    "The cafe on the second floor serves coffee, tea and light lunches. "
+    "If you need any help, ask one of the staff members wearing a blue badge."
+)
+
+def make_speech_clip(output_dir=FIXTURE_DIR, lang="en"):
+    """Create (or reuse) a WAV clip of SPEECH_SCRIPT read by gTTS and return its path"""
+    from tts_engines import GTTSEngine
+
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"speech_{lang}.wav")
+    if os.path.exists(path):
+        return path
+    print(f"🎙️ Synthesizing speech fixture {path}...")
+    speech = GTTSEngine().synthesize(SPEECH_SCRIPT, lang)
+    speech.set_frame_rate(16000).set_channels(1).export(path + ".tmp", format="wav")
+    os.replace(path + ".tmp", path)
+    return path
+
+def speech_segments(seconds):
+    """Timestamps of the fake utterances in a fixture of the given length"""
+    return [(start, min(start + SPEECH_SECONDS, seconds))
+            for start in range(0, int(seconds), SEGMENT_SECONDS)]
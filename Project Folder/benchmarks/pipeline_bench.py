@@ -0,0 +1,126 @@
+"""
+End-to-end benchmark: run the whole dubbing pipeline on synthetic videos of several
+lengths, fully offline, and compare each stage's wall time with a stored baseline.
+
+Translation and TTS always use the local stubs; --stub-models also replaces Demucs
+and Whisper (use it when the models are not downloaded on the box).
+
+Run from the project folder:
+    python benchmarks/pipeline_bench.py --minutes 1 10 60
+    python benchmarks/pipeline_bench.py --minutes 1 --stub-models --update-baseline
+
+Exits with status 1 if any stage got slower than the baseline by more than
+--threshold (relative) and --min-delta seconds.
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+import perf
+from fixtures import make_video
+from stubs import StubTranslationBackend, ToneTTSEngine, stub_models
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+def run_size(minutes, workdir, model_size="tiny", stubbed_models=False, stream=False, language="hindi"):
+    """Run the pipeline once on a fresh workdir and return wall seconds per stage, plus "pipeline" for the total"""
+    video = make_video(minutes)
+    shutil.rmtree(workdir, ignore_errors=True)
+    pipeline = main.build_pipeline(video, language, workdir, os.path.join(workdir, "output.mp4"), model_size,
+                                   stream, translation_backend=StubTranslationBackend(), tts_engine=ToneTTSEngine(),
+                                   use_cache=False)
+    if stubbed_models:
+        stub_models(pipeline, video)
+    for stage in pipeline.stages:
+        stage.run = perf.instrument(f"stage:{stage.name}")(stage.run)
+
+    report = perf.enable(os.path.join(workdir, "perf.json"))
+    report.audio_seconds = minutes * 60
+    try:
+        with perf.measure("pipeline"):
+            pipeline.run(force={"all"})
+    finally:
+        report.write()
+        perf.disable()
+
+    timings = {}
+    for entry in report.stages:
+        if entry["name"] == "pipeline" or entry["name"].startswith("stage:"):
+            timings[entry["name"].replace("stage:", "")] = entry["wall_seconds"]
+    return timings
+
+def compare(results, baseline, threshold, min_delta):
+    """Return a list of human readable regressions of results against baseline"""
+    regressions = []
+    for size, timings in results.items():
+        for stage, seconds in timings.items():
+            base = baseline.get(size, {}).get(stage)
+            if base is None:
+                continue
+            if seconds > base * (1 + threshold) and seconds - base > min_delta:
+                regressions.append(f"{size} {stage}: {seconds:.2f}s vs baseline {base:.2f}s "
+                                   f"(+{(seconds / base - 1) * 100 if base else float('inf'):.0f}%)")
+    return regressions
+
+def print_table(results, baseline):
+    for size, timings in results.items():
+        print(f"\n⏱️ {size}")
+        for stage, seconds in timings.items():
+            base = baseline.get(size, {}).get(stage)
+            against = f"  (baseline {base:.2f}s)" if base is not None else ""
+            print(f"  {stage:<12} {seconds:8.2f}s{against}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, nargs="+", default=[1, 10, 60], help="Fixture lengths to run")
+    parser.add_argument("--workdir", default=os.path.join("benchmarks", ".runs"), help="Scratch directory")
+    parser.add_argument("--model-size", default="tiny", help="Whisper model size")
+    parser.add_argument("--stub-models", action="store_true", help="Replace Demucs and Whisper with stubs")
+    parser.add_argument("--stream", action="store_true", help="Benchmark the streaming pipeline")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline JSON file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Allowed relative slowdown per stage")
+    parser.add_argument("--min-delta", type=float, default=1.0,
+                        help="Ignore slowdowns smaller than this many seconds (noise on short stages)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+    if args.stream and args.stub_models:
+        parser.error("--stream runs Whisper itself, so it cannot be combined with --stub-models")
+
+    # Results for different setups are not comparable, so they are stored under their own keys
+    variant = f"{'stub' if args.stub_models else args.model_size}{'-stream' if args.stream else ''}"
+    results = {}
+    for minutes in args.minutes:
+        size = f"{minutes:g}m-{variant}"
+        results[size] = run_size(minutes, os.path.join(args.workdir, size), args.model_size,
+                                 args.stub_models, args.stream)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_table(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f"\n💾 Baseline updated: {args.baseline}")
+        sys.exit(0)
+
+    regressions = compare(results, baseline, args.threshold, args.min_delta)
+    if regressions:
+        print("\n❌ Regressions:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print("\n✅ No regressions against the baseline" if baseline else "\nℹ️ No baseline yet; run with --update-baseline")
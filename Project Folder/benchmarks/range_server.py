@@ -0,0 +1,97 @@
+"""
+Local stand-in for a media CDN: serves a directory over HTTP with byte-range support,
+a per-connection bandwidth cap and optional dropped connections.
+
+    python benchmarks/range_server.py some/dir --port 8000 --rate-mb 5
+"""
+import argparse
+import os
+import threading
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """SimpleHTTPRequestHandler plus single "bytes=a-b" ranges, throttling and failure injection"""
+
+    # Bytes per second per connection (None for unlimited)
+    rate = None
+    # Cut every fail_every-th range response off halfway (None to never drop)
+    fail_every = None
+    _requests = 0
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        header = self.headers.get("Range")
+        if not header or not header.startswith("bytes=") or not os.path.isfile(path):
+            self._range = self._fail_at = None
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        first, _, last = header[len("bytes="):].partition("-")
+        start = int(first) if first else max(0, size - int(last))
+        end = min(int(last), size - 1) if first and last else size - 1
+        if start >= size or start > end:
+            self.send_error(416, "Requested range not satisfiable")
+            return None
+
+        f = open(path, "rb")
+        f.seek(start)
+        self._range = end - start + 1
+        self._fail_at = None
+        if self.fail_every:
+            with self._lock:
+                type(self)._requests += 1
+                if type(self)._requests % self.fail_every == 0:
+                    self._fail_at = self._range // 2
+        self.send_response(206)
+        self.send_header("Content-Type", self.guess_type(path))
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.send_header("Content-Length", str(self._range))
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        remaining = self._range
+        sent = 0
+        block = 64 * 1024
+        started = time.perf_counter()
+        while remaining is None or remaining > 0:
+            data = source.read(block if remaining is None else min(block, remaining))
+            if not data:
+                break
+            if self._fail_at is not None and sent + len(data) > self._fail_at:
+                # Cut the connection mid-response, like a flaky network would
+                self.close_connection = True
+                return
+            outputfile.write(data)
+            sent += len(data)
+            if remaining is not None:
+                remaining -= len(data)
+            if self.rate:
+                ahead = sent / self.rate - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+def serve(directory, port=0, rate=None, fail_every=None):
+    """Serve directory in a background thread; returns (server, base URL)"""
+    handler = type("Handler", (RangeRequestHandler,), {"rate": rate, "fail_every": fail_every})
+    server = ThreadingHTTPServer(("127.0.0.1", port), partial(handler, directory=directory))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("directory")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--rate-mb", type=float, help="Bandwidth cap per connection in MB/s")
+    args = parser.parse_args()
+    server, url = serve(args.directory, args.port, args.rate_mb * 2 ** 20 if args.rate_mb else None)
+    print(f"Serving {args.directory} at {url}")
+    threading.Event().wait()
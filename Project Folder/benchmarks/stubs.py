@@ -0,0 +1,90 @@
+"""
+Offline stand-ins for the network services and heavy models, so the benchmarks run
+on a CPU-only box without API keys or downloads.
+
+- StubTranslationBackend replaces Gemini in translate.py
+- ToneTTSEngine replaces gTTS in dubbed.py
+- the downloader needs no stub: the download stage copies a local video path
+  instead of calling yt_download
+- stub_models() swaps the Demucs and Whisper stages for cheap ffmpeg/fixture based
+  ones, for timing the rest of the pipeline without the models installed
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pydub.generators import Sine
+import media
+import transcribe
+from translation_backends import TranslationBackend
+from tts_engines import TTSEngine
+from fixtures import speech_segments
+
+WORDS = "the quick brown fox jumps over a lazy dog while seven wizards quietly hum".split()
+
+class StubTranslationBackend(TranslationBackend):
+    """
+    Answers translation prompts locally by tagging the source text with the language.
+    delay adds a fixed wait per request to mimic a network round trip.
+    """
+    model_name = "stub"
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+
+    def generate(self, prompt):
+        if self.delay:
+            time.sleep(self.delay)
+        language = re.search(r"English (?:text|line below)s? to (.+?)[.:]", prompt)
+        tag = f"[{language.group(1) if language else '?'}]"
+        lines = re.findall(r"^<(\d+)> (.*)$", prompt, flags=re.MULTILINE)
+        if lines:
+            return "\n".join(f"<{segment_id}> {tag} {text}" for segment_id, text in lines)
+        # Single segment prompt: the text sits between the instructions, in its own paragraph
+        text = prompt.split("\n\n")[1].rstrip(".")
+        return f"{tag} {text}"
+
+class ToneTTSEngine(TTSEngine):
+    """Speaks every text as a sine tone, 60 ms per character"""
+    name = "tone"
+
+    def __init__(self, frequency=220, ms_per_char=60, sample_rate=24000, delay=0.0):
+        self.frequency = frequency
+        self.ms_per_char = ms_per_char
+        self.sample_rate = sample_rate
+        self.delay = delay
+        self.voice = f"{frequency}hz"
+
+    def synthesize(self, text, lang):
+        if self.delay:
+            time.sleep(self.delay)
+        duration = max(200, len(text) * self.ms_per_char)
+        tone = Sine(self.frequency, sample_rate=self.sample_rate).to_audio_segment(duration=duration, volume=-12)
+        return tone.set_channels(1)
+
+def stub_separate(video_path, vocals_path, music_path):
+    """Write the mixed soundtrack as both stems, skipping Demucs"""
+    os.makedirs(os.path.dirname(vocals_path), exist_ok=True)
+    media.run_ffmpeg(["-i", video_path, "-vn", "-ac", "2", "-ar", "44100", "-c:a", "pcm_s16le", vocals_path,
+                      "-vn", "-ac", "2", "-ar", "44100", "-c:a", "pcm_s16le", music_path])
+
+def stub_transcribe(video_path, transcript_path):
+    """Write a transcript with one made-up sentence per fixture utterance, skipping Whisper"""
+    segments = []
+    for i, (start, end) in enumerate(speech_segments(media.probe_duration(video_path))):
+        words = [WORDS[(i + k) % len(WORDS)] for k in range(6 + i % 5)]
+        segments.append({"text": " " + " ".join(words).capitalize() + ".", "timestamp": [start, end]})
+    transcribe.save_transcription(segments, transcript_path)
+
+def stub_models(pipeline, video_path):
+    """Replace the separate and transcribe stages of a pipeline with the stubs above"""
+    for stage in pipeline.stages:
+        if stage.name == "separate":
+            stage.run = lambda stage=stage: stub_separate(video_path, *stage.outputs)
+        elif stage.name == "transcribe":
+            stage.run = lambda stage=stage: stub_transcribe(video_path, stage.outputs[0])
+        elif stage.name == "stream":
+            raise ValueError("The streaming stage runs Whisper itself and cannot use stub models")
@@ -0,0 +1,71 @@
+"""
+Micro-benchmark: pydub speedup (the old adjust_audio_duration path) against the
+batched WSOLA time-stretch on a few hundred synthetic speech-length segments.
+
+Run from the project folder:
+    python benchmarks/timestretch_bench.py --segments 300
+"""
+import argparse
+import os
+import sys
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio_buffer import AudioBuffer
+from timestretch import fit_batch_to_lengths
+
+def make_segments(count, sample_rate, seed=0):
+    """Voiced-like test signals: a few harmonics with a wobbling pitch and an amplitude envelope"""
+    rng = np.random.default_rng(seed)
+    segments, targets = [], []
+    for _ in range(count):
+        duration = rng.uniform(1.0, 5.0)
+        t = np.arange(int(duration * sample_rate)) / sample_rate
+        pitch = rng.uniform(100, 250) * (1 + 0.05 * np.sin(2 * np.pi * 3 * t))
+        phase = 2 * np.pi * np.cumsum(pitch) / sample_rate
+        voice = sum(np.sin(k * phase) / k for k in range(1, 6))
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(2, 5) * t) ** 2
+        segments.append((0.2 * voice * envelope).astype(np.float32))
+        targets.append(duration / rng.uniform(0.6, 1.8))
+    return segments, targets
+
+def bench_pydub(segments, targets, sample_rate):
+    from pydub import AudioSegment
+
+    audios = [AudioBuffer(samples[None], sample_rate).to_audio_segment() for samples in segments]
+    start = time.perf_counter()
+    for audio, target in zip(audios, targets):
+        target_ms = int(target * 1000)
+        speed = max(0.5, min(2.0, len(audio) / target_ms))
+        # speedup() can't slow audio down, so factors below 1 only pad
+        adjusted = audio.speedup(playback_speed=speed) if speed > 1 else audio
+        adjusted = adjusted[:target_ms]
+        if len(adjusted) < target_ms:
+            adjusted += AudioSegment.silent(duration=target_ms - len(adjusted))
+    return time.perf_counter() - start
+
+def bench_wsola(segments, targets, sample_rate):
+    start = time.perf_counter()
+    fit_batch_to_lengths(segments, [int(target * sample_rate) for target in targets], sample_rate)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--segments", type=int, default=300)
+    parser.add_argument("--sample-rate", type=int, default=24000)
+    args = parser.parse_args()
+
+    segments, targets = make_segments(args.segments, args.sample_rate)
+    audio_seconds = sum(len(segment) for segment in segments) / args.sample_rate
+    print(f"{args.segments} segments, {audio_seconds:.0f}s of audio")
+
+    wsola = bench_wsola(segments, targets, args.sample_rate)
+    print(f"WSOLA (batched): {wsola:.2f}s ({audio_seconds / wsola:.0f}x real time)")
+    try:
+        pydub_time = bench_pydub(segments, targets, args.sample_rate)
+        print(f"pydub speedup:   {pydub_time:.2f}s ({audio_seconds / pydub_time:.0f}x real time)")
+        print(f"Speedup: {pydub_time / wsola:.1f}x")
+    except ImportError:
+        print("pydub not installed, skipping the comparison")
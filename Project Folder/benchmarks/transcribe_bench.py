@@ -0,0 +1,112 @@
+"""
+Compare transcription engines on a speech clip: load time, transcription speed and
+word error rate (WER) against the reference backend's transcript.
+
+On offline workers, pass a speech clip of your own with --clip (any audio or video
+ffmpeg reads; a minute or two of clear speech is plenty). Without --clip the
+benchmark synthesizes a fixture clip with gTTS, which needs gTTS and network access
+once, and then also reports the WER against the script that was read out.
+
+Run from the project folder:
+    python benchmarks/transcribe_bench.py --clip talk.wav --model-size medium
+    python benchmarks/transcribe_bench.py --clip talk.wav --engines whisper-int8 --threads 4 --beam-size 5
+    python benchmarks/transcribe_bench.py  # synthesized fixture clip, online only
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import transcribe
+from audio_buffer import AudioBuffer
+from fixtures import SPEECH_SCRIPT, make_speech_clip
+from transcription_engines import ENGINES, get_engine
+
+def normalize_words(text):
+    """Lower-case words without punctuation, so WER only counts recognition errors"""
+    return re.findall(r"[\w']+", text.lower())
+
+def word_error_rate(reference, hypothesis):
+    """(substitutions + deletions + insertions) / reference words, by word-level edit distance"""
+    ref, hyp = normalize_words(reference), normalize_words(hypothesis)
+    if not ref:
+        return 0.0 if not hyp else 1.0
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i]
+        for j, hyp_word in enumerate(hyp, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ref_word != hyp_word)))
+        previous = current
+    return previous[-1] / len(ref)
+
+def ratio(numerator, elapsed):
+    """numerator / elapsed, or None when the timer didn't register any time (a near-empty clip)"""
+    return numerator / elapsed if elapsed > 0 else None
+
+def format_ratio(value, width, digits):
+    return f"{'-':>{width}}" if value is None else f"{value:>{width}.{digits}f}"
+
+def run_engine(engine, samples, workers=1):
+    """Transcribe samples with engine; returns (load seconds, transcribe seconds, text, word count)"""
+    start = time.perf_counter()
+    engine.load()
+    loaded = time.perf_counter()
+    segments = transcribe.transcribe_parallel(samples, engine.model_size, workers=workers, engine=engine)
+    elapsed = time.perf_counter() - loaded
+    text = " ".join(segment["text"].strip() for segment in segments)
+    words = sum(len(segment.get("words") or []) for segment in segments)
+    return loaded - start, elapsed, text, words
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clip", help="Audio or video with speech; required offline "
+                                       "(default: a fixture clip synthesized with gTTS)")
+    parser.add_argument("--model-size", default="small", help="Whisper model size")
+    parser.add_argument("--reference", default="whisper", choices=list(ENGINES), help="Backend the others are scored against")
+    parser.add_argument("--engines", nargs="+", default=["whisper-int8", "faster-whisper"], choices=list(ENGINES),
+                        help="Backends to compare with the reference")
+    parser.add_argument("--threads", type=int, help="CPU threads per engine")
+    parser.add_argument("--beam-size", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.clip and not os.path.isfile(args.clip):
+        sys.exit(f"Clip not found: {args.clip}")
+    try:
+        clip = args.clip or make_speech_clip()
+    except Exception as e:
+        sys.exit(f"Could not synthesize the fixture clip ({type(e).__name__}: {e}); "
+                 "it needs gTTS and network access. Pass --clip with a speech recording to run offline.")
+    samples = AudioBuffer(transcribe.load_whisper_audio(clip)[None], transcribe.WHISPER_SAMPLE_RATE)
+    print(f"Clip: {clip} ({samples.duration:.1f}s)\n")
+
+    rows = []
+    reference_text = None
+    for name in [args.reference] + [name for name in args.engines if name != args.reference]:
+        engine = get_engine(name, args.model_size, threads=args.threads, beam_size=args.beam_size,
+                            batch_size=args.batch_size)
+        try:
+            load_time, elapsed, text, words = run_engine(engine, samples)
+        except ImportError as e:
+            # Every WER is scored against the reference, so the table means nothing without it
+            if name == args.reference:
+                sys.exit(f"Reference engine {name} is not available ({e}); install it or pick another with --reference")
+            print(f"⚠️ Skipping {name}: {e}")
+            continue
+        if reference_text is None:
+            reference_text = text
+        rows.append((name, load_time, elapsed, ratio(samples.duration, elapsed), words,
+                     word_error_rate(reference_text, text),
+                     None if args.clip else word_error_rate(SPEECH_SCRIPT, text)))
+        print(f"📝 {name}: {text}\n")
+
+    reference_time = rows[0][2]
+    print(f"{'engine':<16}{'load':>8}{'transcribe':>12}{'x real time':>13}{'speedup':>9}{'words':>7}"
+          f"{'WER vs ' + args.reference:>18}{'WER vs script' if not args.clip else '':>15}")
+    for name, load_time, elapsed, realtime, words, wer, script_wer in rows:
+        print(f"{name:<16}{load_time:>7.1f}s{elapsed:>11.1f}s{format_ratio(realtime, 13, 1)}"
+              f"{format_ratio(ratio(reference_time, elapsed), 8, 2)}x"
+              f"{words:>7}{wer:>17.1%}{'' if script_wer is None else format(script_wer, '.1%'):>15}")
@@ -1,131 +1,235 @@
-import re
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from gtts import gTTS
-from pydub import AudioSegment
+import numpy as np
+from tts_engines import GTTSEngine
+from audio_buffer import AudioBuffer, from_audio_segment, open_wav_memmap
+from timestretch import fit_batch_to_lengths
+from segments import changed_ranges, drop_snapshot, iter_segments, load_snapshot, merge_ranges, read_header, save_snapshot
+import perf
 
-def parse_timestamped_text(file_path):
+# Sample rate of the dubbed track (gTTS produces 24 kHz mono speech)
+DUB_SAMPLE_RATE = 24000
+
+def read_translated_segments(file_path, language=None):
     """
-    Parse a file containing timestamped text segments.
-    Expected format: [start_time - end_time] text
-    Returns a list of (start_time, end_time, text) tuples.
+    Read (segment id, start_time, end_time, text) tuples from a translation segment store.
+    language picks the translation to speak; by default the one the store was written for.
     """
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
-    
-    # Regular expression to match timestamps and text
-    pattern = r'\[([\d.]+) - ([\d.]+)\]\s+(.*?)(?=\n\[|$)'
-    matches = re.findall(pattern, content, re.DOTALL)
-    
+    language = language or read_header(file_path).get("language")
     result = []
-    for start_time, end_time, text in matches:
-        result.append((float(start_time), float(end_time), text.strip()))
-    
+    for segment in iter_segments(file_path, fields=("start", "end", "translations")):
+        text = segment.get("translations", {}).get(language)
+        if text:
+            result.append((segment["id"], segment["start"], segment["end"], text))
     return result
 
-def text_to_speech(text, lang, output_file):
-    """Generate speech from text and save to file"""
-    tts = gTTS(text=text, lang=lang, slow=False)
-    tts.save(output_file)
-    return output_file
+def synthesize_with_retry(engine, text, lang, retries=2, backoff=1.0):
+    """Synthesize one segment, retrying with exponential backoff on failure"""
+    for attempt in range(retries + 1):
+        try:
+            start = time.perf_counter()
+            speech = engine.synthesize(text, lang)
+            perf.record_latency("tts_segment", time.perf_counter() - start)
+            return speech
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt)
+            print(f"TTS error ({e}), retrying in {delay:.1f}s...")
+            time.sleep(delay)
 
-def adjust_audio_duration(audio_segment, target_duration_ms):
+def synthesize_segments(texts, lang, engine=None, max_workers=4, retries=2, cache=None):
     """
-    Adjust audio segment to match target duration by speeding up/slowing down
-    without changing pitch.
+    Synthesize many text segments concurrently with at most max_workers requests in flight.
+    With a TTSCache, previously synthesized texts are loaded as PCM instead of synthesized,
+    and repeated texts are synthesized once. The cache is not trimmed here: scanning it is
+    costly, so callers run cache.evict() once per dub run.
+    Returns the AudioSegments in the same order as texts.
     """
-    current_duration_ms = len(audio_segment)
-    
-    if current_duration_ms == 0:
-        return AudioSegment.silent(duration=target_duration_ms)
-    
-    # Prevent division by zero
-    if target_duration_ms == 0:
-        return AudioSegment.silent(duration=1)  # Return minimal silence
-    
-    # Calculate the necessary speed factor
-    speed_factor = current_duration_ms / target_duration_ms
-    
-    # if abs(speed_factor - 1.0) < 0.05:  # If difference is less than 5%
-    #     return audio_segment
-    
-    # Limit speed adjustment to reasonable bounds
-    speed_factor = max(0.5, min(2.0, speed_factor))
-    
-    # Apply speed change
-    adjusted_audio = audio_segment.speedup(playback_speed=speed_factor)
-    
-    # If still not exact, trim or pad
-    final_duration = len(adjusted_audio)
-    if final_duration > target_duration_ms:
-        # Trim end
-        adjusted_audio = adjusted_audio[:target_duration_ms]
-    elif final_duration < target_duration_ms:
-        # Pad with silence
-        silence_ms = target_duration_ms - final_duration
-        adjusted_audio = adjusted_audio + AudioSegment.silent(duration=silence_ms)
+    engine = engine or GTTSEngine()
+
+    def synthesize(text):
+        if cache is None:
+            return synthesize_with_retry(engine, text, lang, retries)
+        key = cache.make_key(text, lang, engine.name, engine.voice)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached.to_audio_segment()
+        speech = synthesize_with_retry(engine, text, lang, retries)
+        cache.put(key, from_audio_segment(speech))
+        return speech
+
+    unique_texts = list(dict.fromkeys(texts))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        speeches = dict(zip(unique_texts, executor.map(synthesize, unique_texts)))
+
+    if cache is not None:
+        stats = cache.stats()
+        print(f"TTS cache: {stats['hits']} hits, {stats['misses']} misses")
+    return [speeches[text] for text in texts]
+
+def adjust_durations(speeches, target_durations, sample_rate=DUB_SAMPLE_RATE):
+    """
+    Time-stretch a list of AudioSegments to their target durations (seconds) in one batch.
+    Speech is slowed down as well as sped up (within 0.5x-2x), keeping its pitch.
+    Returns mono float sample arrays at sample_rate.
+    """
+    signals = [from_audio_segment(speech.set_frame_rate(sample_rate).set_channels(1)).samples[0] for speech in speeches]
+    target_lengths = [max(0, int(round(duration * sample_rate))) for duration in target_durations]
+    return fit_batch_to_lengths(signals, target_lengths, sample_rate)
+
+def assemble_timeline(placements, duration, sample_rate=DUB_SAMPLE_RATE):
+    """
+    Place mono float sample arrays on a silent timeline of the given duration (seconds).
+    placements is a list of (start_time, samples) pairs. The buffer is allocated once and
+    each segment is written at its exact sample offset; overlapping segments are mixed.
+    """
+    timeline = np.zeros(int(round(duration * sample_rate)), dtype=np.float32)
+    for start_time, samples in placements:
+        offset = max(0, int(round(start_time * sample_rate)))
+        end = min(len(timeline), offset + len(samples))
+        if end > offset:
+            timeline[offset:end] += samples[:end - offset]
+    return timeline
+
+def export_dubbed_audio(placements, duration, final_output, sample_rate=DUB_SAMPLE_RATE):
+    """
+    Assemble placed segments into one track of the given duration and export it.
+    WAV output is written as 16-bit PCM, which later runs can patch in place; other
+    extensions (e.g. .mp3) are encoded through pydub.
+    """
+    timeline = assemble_timeline(placements, duration, sample_rate)
+    final_audio = AudioBuffer(timeline[None], sample_rate)
     
-    return adjusted_audio
+    # Export the final audio
+    print(f"\nExporting final audio to {final_output}...")
+    if final_output.endswith(".wav"):
+        final_audio.save_wav(final_output)
+    else:
+        final_audio.to_audio_segment().export(final_output, format=os.path.splitext(final_output)[1][1:])
+    print(f"Successfully created audio file: {final_output}")
+    print(f"Total duration: {final_audio.duration:.2f} seconds")
+    return final_output
+
+def segment_key(text, lang, engine, start_time, end_time):
+    """Identify what a segment puts on the dubbed track, to tell whether it needs redoing"""
+    data = json.dumps([text, lang, engine.name, engine.voice, round(start_time, 3), round(end_time, 3)])
+    return hashlib.sha1(data.encode()).hexdigest()[:16]
+
+def dub_snapshot(segments, lang, engine, sample_rate=DUB_SAMPLE_RATE):
+    """Snapshot of a dubbed track built from (id, start, end, text) segments, see segments.changed_ranges"""
+    total_duration = max((end_time for _, _, end_time, _ in segments), default=0)
+    return {
+        "sample_rate": sample_rate,
+        "frames": int(round(total_duration * sample_rate)),
+        "segments": {str(segment_id): {"start": start_time, "end": end_time,
+                                       "key": segment_key(text, lang, engine, start_time, end_time)}
+                     for segment_id, start_time, end_time, text in segments},
+    }
+
+def _place(segments, speeches, sample_rate=DUB_SAMPLE_RATE):
+    """Time-stretch speeches to their segments' slots; returns (start_time, samples) placements"""
+    adjusted = adjust_durations(speeches, [end_time - start_time for _, start_time, end_time, _ in segments], sample_rate)
+    return [(start_time, samples) for (_, start_time, _, _), samples in zip(segments, adjusted)]
+
+def patch_dubbed_audio(final_output, segments, ranges, lang, engine, max_workers=4, retries=2, cache=None):
+    """
+    Redo only the given time ranges of an existing dubbed WAV track, in place.
+    Every segment overlapping a range is synthesized again (the TTS cache makes unchanged
+    ones cheap) and the ranges are grown to cover such segments whole, so each range can
+    be cleared and rebuilt from its segments alone.
+    """
+    while True:
+        affected = [segment for segment in segments
+                    if any(segment[1] < end and segment[2] > start for start, end in ranges)]
+        grown = merge_ranges(ranges + [(segment[1], segment[2]) for segment in affected])
+        if grown == ranges:
+            break
+        ranges = grown
+
+    speeches = synthesize_segments([text for _, _, _, text in affected], lang, engine, max_workers, retries, cache)
+    placements = _place(affected, speeches)
+    track, sample_rate = open_wav_memmap(final_output)
+    for start, end in ranges:
+        first = max(0, int(np.floor(start * sample_rate)))
+        last = min(len(track), int(np.ceil(end * sample_rate)) + 1)
+        region = np.zeros(last - first, dtype=np.float32)
+        for start_time, samples in placements:
+            offset = max(0, int(round(start_time * sample_rate))) - first
+            lo, hi = max(0, offset), min(len(region), offset + len(samples))
+            if hi > lo:
+                region[lo:hi] += samples[lo - offset:hi - offset]
+        track[first:last, 0] = (np.clip(region, -1.0, 1.0) * 32767).astype(np.int16)
+    track.flush()
+    print(f"Re-dubbed {len(affected)} segments in {len(ranges)} changed ranges of {final_output}")
+    return ranges
 
-def dub_text_with_timestamps(input_file, lang, output_dir, final_output):
+@perf.instrument("dub_text_with_timestamps")
+def dub_text_with_timestamps(input_file, lang, output_dir, final_output, engine=None, max_workers=4, retries=2, save_segments=False, cache=None,
+                             incremental=True):
     """
     Main function to dub text segments according to timestamps and merge them.
     Ensures output audio maintains original timestamps.
+    Segments are synthesized concurrently by engine (gTTS by default) with up to
+    max_workers requests at once; set save_segments to keep each segment's MP3 in output_dir.
+    Pass a TTSCache to reuse speech synthesized in earlier runs.
+    With incremental=True and a WAV final_output from an earlier run, only the segments
+    whose text or timing changed since then are redone, patched into the existing track.
     """
+    engine = engine or GTTSEngine()
     # Create output directory if it doesn't exist
     Path(output_dir).mkdir(exist_ok=True)
     
-    # Parse the timestamped text
-    segments = parse_timestamped_text(input_file)
+    # Read the translated segments
+    segments = read_translated_segments(input_file)
     print(f"Found {len(segments)} text segments to process")
-    
-    # Create a blank audio file that will hold our final output
-    final_audio = AudioSegment.silent(duration=0)
-    last_end_time = 0
-    
-    # Process each segment
-    for i, (start_time, end_time, text) in enumerate(segments):
-        # Generate output filename for this segment
-        segment_file = os.path.join(output_dir, f"segment_{i+1:03d}.mp3")
-        
-        # Convert text to speech
-        text_to_speech(text, lang, segment_file)
-        
-        # Load the generated speech
-        speech = AudioSegment.from_mp3(segment_file)
-        
-        # Calculate desired duration in milliseconds
-        target_duration_ms = int((end_time - start_time) * 1000)
-        
-        # Adjust speech to match target duration
-        adjusted_speech = adjust_audio_duration(speech, target_duration_ms)
-        
-        # Add silence gap if needed
-        silence_duration_ms = int((start_time - last_end_time) * 1000)
-        if silence_duration_ms > 0:
-            final_audio += AudioSegment.silent(duration=silence_duration_ms)
-        
-        # Add the adjusted speech
-        final_audio += adjusted_speech
-        
-        # Update last_end_time
-        last_end_time = end_time
-        
-        print(f"Added segment with duration: {target_duration_ms/1000:.2f} seconds")
-    
-    # Export the final audio
-    print(f"\nExporting final audio to {final_output}...")
-    final_audio.export(final_output, format="mp3")
-    print(f"Successfully created audio file: {final_output}")
-    print(f"Total duration: {len(final_audio)/1000:.2f} seconds")
+    total_duration = max((end_time for _, _, end_time, _ in segments), default=0)
+    state = dub_snapshot(segments, lang, engine)
+
+    previous = load_snapshot(final_output) if incremental and final_output.endswith(".wav") else None
+    if (previous and os.path.exists(final_output) and state["frames"] > 0
+            and previous["sample_rate"] == state["sample_rate"] and previous["frames"] == state["frames"]):
+        ranges = changed_ranges(previous["segments"], state["segments"])
+        if ranges:
+            drop_snapshot(final_output)
+            patch_dubbed_audio(final_output, segments, ranges, lang, engine, max_workers, retries, cache)
+            if cache is not None:
+                cache.evict()
+        else:
+            print(f"No segments changed since {final_output} was dubbed")
+        save_snapshot(final_output, state)
+        return final_output
+    
+    # Convert all texts to speech, several requests at a time
+    speeches = synthesize_segments([text for _, _, _, text in segments], lang, engine, max_workers, retries, cache)
+    if cache is not None:
+        cache.evict()
+    
+    if save_segments:
+        for i, speech in enumerate(speeches):
+            speech.export(os.path.join(output_dir, f"segment_{i+1:03d}.mp3"), format="mp3")
+    
+    # Adjust every segment to its time slot in one batched time-stretch
+    placements = _place(segments, speeches)
+    print(f"Adjusted {len(placements)} segments to their timestamps")
+    
+    # Write every segment into one preallocated timeline
+    drop_snapshot(final_output)
+    export_dubbed_audio(placements, total_duration, final_output)
+    if final_output.endswith(".wav"):
+        save_snapshot(final_output, state)
     
     return final_output
 
 # Hardcoded values
-# input_file = "tempfile/transcription_hindi.txt"
+# input_file = "tempfile/transcription_hindi.jsonl"
 # language = "hindi"  
 # temp_directory = "tempfile/dubbed_temp"
-# final_output = "tempfile/complete_dubbed.mp3"
+# final_output = "tempfile/complete_dubbed.wav"
 
 # # Execute the function with hardcoded values
 # dub_text_with_timestamps(input_file, language, temp_directory, final_output)
\ No newline at end of file
@@ -1,10 +1,16 @@
-import yt_download
-import aud
-import sep
-import transcribe
+import argparse
+import json
+import os
+import shutil
 import translate
-import dubbed
-import merge_aud
+from pipeline import Pipeline, Stage
+from transcription_engines import ENGINES, get_engine
+from tts_engines import GTTSEngine
+import perf
+
+# Stage modules pull in torch, Demucs, Whisper, MoviePy and the API clients, which take
+# seconds to import. Each stage imports only what it needs when it runs, so re-running
+# a single late stage starts quickly.
 
 def get_language_code(language):
     # You can expand this mapping as needed
@@ -45,56 +51,328 @@ def get_language_code(language):
     }
     return mapping.get(language.lower(), language)
 
+# Separation decodes the video's audio straight into Demucs as it goes; set DUBAI_KEEP_ARTIFACTS=1
+# to also write the extracted aud.wav for debugging
+KEEP_ARTIFACTS = os.environ.get("DUBAI_KEEP_ARTIFACTS") == "1"
+
+# Set DUBAI_MODEL_SERVER=localhost:port (or a Unix socket path) to run separation and
+# transcription in a model_server.py worker that keeps the models loaded between runs
+MODEL_SERVER = os.environ.get("DUBAI_MODEL_SERVER")
+
+STAGE_NAMES = ["download", "separate", "transcribe", "translate", "dub", "stream", "video", "merge"]
+
+# Stages that work on the translated side of the pipeline and so need a target language
+LANGUAGE_STAGES = {"translate", "dub", "stream", "merge"}
+
+def stage_order(stream=False):
+    """Names of the stages build_pipeline creates, in order"""
+    skipped = {"transcribe", "translate", "dub"} if stream else {"stream"}
+    return [name for name in STAGE_NAMES if name not in skipped]
+
+def select_stages(command="run", start=None, end=None, stream=False):
+    """
+    Stages picked on the command line: a single stage, a --from/--to range, or None for
+    the whole pipeline.
+    """
+    order = stage_order(stream)
+    if command != "run":
+        if command not in order:
+            raise ValueError(f"Stage '{command}' is not part of the {'streaming' if stream else 'sequential'} pipeline")
+        return [command]
+    if start is None and end is None:
+        return None
+    for name in (start, end):
+        if name is not None and name not in order:
+            raise ValueError(f"Stage '{name}' is not part of the {'streaming' if stream else 'sequential'} pipeline")
+    first = order.index(start) if start else 0
+    last = order.index(end) if end else len(order) - 1
+    if first > last:
+        raise ValueError(f"--from {start} comes after --to {end}")
+    return order[first:last + 1]
+
+def load_source(workdir):
+    """
+    Where the workdir's video came from, as {"url", "local"}, so later runs of single
+    stages know it without being given the URL again. Workdirs from before the source was
+    recorded are recognised by their files: a copied local video has no separate audio stream.
+    """
+    try:
+        with open(os.path.join(workdir, "source.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+    if os.path.exists(os.path.join(workdir, "vid.mp4")) and not os.path.exists(os.path.join(workdir, "source_audio.m4a")):
+        return {"url": None, "local": True}
+    return None
+
+def save_source(workdir, url, local):
+    with open(os.path.join(workdir, "source.json"), "w") as f:
+        json.dump({"url": url, "local": local}, f)
+
+def build_pipeline(url, translation_lan, workdir="tempfile", output_video_path="output.mp4", model_size="medium",
+                   stream=False, translation_backend=None, tts_engine=None, use_cache=True, transcribe_workers=None,
+                   transcription_engine=None):
+    """
+    Describe the dubbing pipeline as stages with their input files, output files and
+    parameters. Outputs that depend on the target language carry it in their file name,
+    so several languages can share the language-independent stages in one workdir.
+    With stream=True, transcription, translation and dubbing run as one overlapping stage.
+    translation_backend and tts_engine replace Gemini and gTTS (e.g. with offline stubs);
+    use_cache=False bypasses the translation and TTS caches.
+    transcribe_workers sets how many processes share transcription (default: chosen from the CPU count).
+    transcription_engine (see transcription_engines.py) replaces openai-whisper of model_size,
+    e.g. with the int8 quantized CPU backends.
+    For a YouTube URL, "download" only waits for the audio stream; the video stream keeps
+    downloading in the background and the "video" stage collects it before the merge.
+    Without a url, the source recorded in workdir by an earlier download is used.
+    """
+    transcription_engine = transcription_engine or get_engine("whisper", model_size)
+    tts_engine = tts_engine or GTTSEngine()
+    # Another engine or voice makes a different dubbed track
+    tts_params = {"engine": tts_engine.name, "voice": tts_engine.voice}
+    # Thread count doesn't change the transcript, the rest of the engine settings do
+    engine_params = {key: value for key, value in transcription_engine.spec().items() if key != "threads"}
+    lang_suffix = translation_lan.replace(' ', '_')
+    language = get_language_code(translation_lan)
+    paths = {
+        "video": os.path.join(workdir, "vid.mp4"),
+        "source_audio": os.path.join(workdir, "source_audio.m4a"),
+        "audio": os.path.join(workdir, "aud.wav"),
+        "vocals": os.path.join(workdir, "aud", "vocals.wav"),
+        "music": os.path.join(workdir, "aud", "music.wav"),
+        "transcript": os.path.join(workdir, "transcription.jsonl"),
+        "translation": os.path.join(workdir, f"transcription_{lang_suffix}.jsonl"),
+        "dubbed_temp": os.path.join(workdir, "dubbed_temp"),
+        "dubbed": os.path.join(workdir, f"complete_dubbed_{language}.wav"),
+        "mix": os.path.join(workdir, f"mix_{language}.pcm"),
+        "output": output_video_path,
+    }
+
+    if url:
+        local_source = os.path.isfile(url)
+    else:
+        saved = load_source(workdir) or {}
+        url, local_source = saved.get("url") or "", saved.get("local", False)
+    # What the audio stages read: the local video itself, or the separately downloaded audio stream
+    audio_source = paths["video"] if local_source else paths["source_audio"]
+    # The background download started by "download" and collected by "video"
+    fetches = {}
+
+    @perf.instrument("video_download")
+    def download():
+        # 🎥 Step 0: Download the YouTube Video (or copy a local file)
+        save_source(workdir, url, local_source)
+        if local_source:
+            shutil.copyfile(url, paths["video"])
+        else:
+            import yt_download
+            fetches["media"] = yt_download.MediaFetch(url, workdir).start()
+            fetches["media"].wait_audio()
+            print("✅ Audio downloaded, video still downloading in the background\n")
+
+    @perf.instrument("video_download")
+    def fetch_video():
+        import yt_download
+
+        # 🎥 Wait for the video stream (or download it, if this run didn't start it) and mux in the audio
+        fetcher = fetches.pop("media", None) or yt_download.MediaFetch(url, workdir)
+        fetcher.wait_video(paths["video"])
+        print("✅ Video download complete!\n")
+
+    def separate():
+        import aud
+        import sep
+        from model_server import ModelClient
+
+        if KEEP_ARTIFACTS:
+            aud.extract_audio_from_video(audio_source, paths["audio"])
+
+        # 🎵🎤 Steps 1-2: Extract the audio and separate vocals and music; windows are
+        # separated while ffmpeg is still decoding the rest of the audio
+        print("🎧 Extracting audio and separating vocals and music...")
+        stem_dir = os.path.dirname(paths["vocals"])
+        if MODEL_SERVER:
+            worker = ModelClient(MODEL_SERVER)
+            worker.separate_audio(audio_source, stem_dir)
+            worker.close()
+        else:
+            sep.separate_audio_streaming(audio_source, stem_dir)
+        print("✅ Audio separation complete!\n")
+
+    def transcribe_vocals():
+        import transcribe
+        from model_server import ModelClient
+
+        # 📝 Step 3: Transcribe Audio to Text
+        print("📝 Transcribing vocals...")
+        if MODEL_SERVER:
+            worker = ModelClient(MODEL_SERVER)
+            segments = worker.transcribe(paths["vocals"], model_size, transcription_engine.spec())
+            worker.close()
+        else:
+            segments = transcribe.transcribe_parallel(paths["vocals"], model_size, workers=transcribe_workers,
+                                                      engine=transcription_engine)
+        transcribe.save_transcription(segments, paths["transcript"])
+        print(f"✅ Transcription complete: {paths['vocals']} → {paths['transcript']}\n")
+
+    def translate_transcript():
+        from translation_cache import TranslationCache
+
+        # 🌐 Step 4: Translate Transcription
+        translate.translate_transcript(paths["transcript"], translation_lan, backend=translation_backend,
+                                       cache=TranslationCache() if use_cache else None,
+                                       output_file=paths["translation"])
+        print("✅ Translation complete!\n")
+
+    def dub():
+        import dubbed
+        from tts_cache import TTSCache
+
+        # 🗣️ Step 5: Generate Dubbed Audio with Translation
+        print("🔊 Generating dubbed audio with translated text...")
+        dubbed.dub_text_with_timestamps(paths["translation"], language, paths["dubbed_temp"], paths["dubbed"],
+                                        engine=tts_engine, cache=TTSCache() if use_cache else None)
+        print("✅ Dubbed audio generation complete!\n")
+
+    def stream_dub():
+        import streaming
+        from translation_cache import TranslationCache
+        from tts_cache import TTSCache
+
+        # 📝🌐🗣️ Steps 3-5 overlapped: segments are translated and dubbed while Whisper is still running
+        print("📝 Transcribing, translating and dubbing as segments arrive...")
+        streaming.stream_dub(paths["vocals"], translation_lan, language, paths["transcript"], paths["translation"],
+                             paths["dubbed"], model_size=model_size, backend=translation_backend, engine=tts_engine,
+                             transcription_engine=transcription_engine,
+                             translation_cache=TranslationCache() if use_cache else None,
+                             tts_cache=TTSCache() if use_cache else None)
+        print("✅ Dubbed audio generation complete!\n")
+
+    def merge():
+        # 🎬 Step 6: Mix the dubbed audio over the ducked music and add it to the video
+        print("🎵 Merging dubbed audio and background music into the video...")
+        merge_aud.merge_into_video(paths["video"], paths["dubbed"], paths["music"], paths["output"],
+                                   segments_file=paths["translation"], mix_path=paths["mix"])
+        print(f"✅ Video with dubbed audio created successfully: {paths['output']}\n")
+
+    stages = [
+        # A local source is hashed like any input, so replacing the file re-runs everything after it
+        Stage("download", download, inputs=[url] if local_source and os.path.isfile(url) else [],
+              outputs=[audio_source], params={"url": url}, resource="io"),
+        Stage("separate", separate, inputs=[audio_source], outputs=[paths["vocals"], paths["music"]],
+              params={"model": "htdemucs"}, resource="cpu"),
+    ]
+    if stream:
+        stages.append(Stage("stream", stream_dub, inputs=[paths["vocals"]],
+                            outputs=[paths["transcript"], paths["translation"], paths["dubbed"]],
+                            params={"model_size": model_size, "language": translation_lan,
+                                    "prompt_version": translate.PROMPT_VERSION, **tts_params,
+                                    "transcription": engine_params},
+                            resource="cpu"))
+    else:
+        stages += [
+            Stage("transcribe", transcribe_vocals, inputs=[paths["vocals"]], outputs=[paths["transcript"]],
+                  params={"model_size": model_size, "vad": True, "transcription": engine_params}, resource="cpu"),
+            Stage("translate", translate_transcript, inputs=[paths["transcript"]], outputs=[paths["translation"]],
+                  params={"language": translation_lan, "prompt_version": translate.PROMPT_VERSION}, resource="io"),
+            Stage("dub", dub, inputs=[paths["translation"]], outputs=[paths["dubbed"]],
+                  params={"language": language, **tts_params}, resource="io"),
+        ]
+    if not local_source:
+        stages.append(Stage("video", fetch_video, inputs=[audio_source], outputs=[paths["video"]],
+                            params={"url": url}, resource="io"))
+    # Light to import (NumPy and ffmpeg only); the merge parameters are part of its fingerprint
+    import merge_aud
+    stages += [
+        Stage("merge", merge, inputs=[paths["video"], paths["dubbed"], paths["music"], paths["translation"]],
+              outputs=[paths["output"]], params={"duck_db": merge_aud.DUCK_DB, "limit": merge_aud.LIMIT_CEILING},
+              resource="cpu"),
+    ]
+    os.makedirs(workdir, exist_ok=True)
+    return Pipeline(stages, os.path.join(workdir, "pipeline_state.json"))
+
 if __name__ == "__main__":
-    # 🎥 Step 0: Download the YouTube Video
-    print("📥 Enter the URL of the YouTube video to download:")
-    yt_download.video_download(input())
-    print("🌍 Enter the target language for translation:")
-    translation_lan = input().lower()
+    parser = argparse.ArgumentParser(
+        description="Dub a YouTube video into another language",
+        epilog="Examples: main.py --url URL --language hindi | main.py merge --language hindi | "
+               "main.py run --from translate --to dub --language hindi")
+    parser.add_argument("command", nargs="?", default="run", choices=["run"] + STAGE_NAMES,
+                        help="Run one stage on the artifacts already in --workdir, or the whole pipeline (default)")
+    parser.add_argument("--from", dest="start", choices=STAGE_NAMES, help="With run: first stage to run")
+    parser.add_argument("--to", dest="end", choices=STAGE_NAMES, help="With run: last stage to run")
+    parser.add_argument("--url", help="YouTube video URL or local video file (asked for if omitted)")
+    parser.add_argument("--language", help="Target language, e.g. hindi (asked for if omitted)")
+    parser.add_argument("--workdir", default="tempfile", help="Directory for intermediate files")
+    parser.add_argument("--output", default="output.mp4", help="Path of the dubbed video")
+    parser.add_argument("--model-size", default="medium", help="Whisper model size")
+    parser.add_argument("--force", action="append", default=[], choices=STAGE_NAMES + ["all"],
+                        help="Re-run a stage even if it is up to date (repeatable)")
+    parser.add_argument("--dry-run", action="store_true", help="Only show which stages would run")
+    parser.add_argument("--transcribe-workers", type=int,
+                        help="Processes transcribing speech regions in parallel (default: based on CPU count)")
+    parser.add_argument("--transcribe-engine", default="whisper", choices=list(ENGINES),
+                        help="Speech-to-text backend; whisper-int8 and faster-whisper run int8 quantized on the CPU")
+    parser.add_argument("--transcribe-threads", type=int, help="CPU threads per transcription worker")
+    parser.add_argument("--beam-size", type=int, default=1, help="Transcription beam size (1 decodes greedily)")
+    parser.add_argument("--batch-size", type=int, default=1,
+                        help="Speech windows decoded together, on engines that batch (faster-whisper)")
+    parser.add_argument("--stream", action="store_true",
+                        help="Translate and dub segments while transcription is still running")
+    parser.add_argument("--perf-report", default=os.environ.get("DUBAI_PERF_REPORT"),
+                        help="Write per-stage timings, CPU, memory and I/O to this JSON file")
+    args = parser.parse_args()
+    if args.command != "run" and (args.start or args.end):
+        parser.error("--from and --to only apply to the run command")
+    try:
+        selected = select_stages(args.command, args.start, args.end, args.stream)
+    except ValueError as e:
+        parser.error(str(e))
+
+    # Only ask for what the selected stages use
+    url = args.url or ""
+    source = load_source(args.workdir)
+    # The video stage needs the URL too, unless the workdir came from a local file or remembers it
+    needs_url = selected is None or "download" in selected or (
+        "video" in selected and not (source and (source["local"] or source["url"])))
+    if not url and needs_url:
+        print("📥 Enter the URL of the YouTube video to download:")
+        url = input()
+    translation_lan = args.language or ""
+    if not translation_lan and (selected is None or LANGUAGE_STAGES & set(selected)):
+        print("🌍 Enter the target language for translation:")
+        translation_lan = input()
     print("\n\n")
 
-    # 🎵 Step 1: Extract Audio from Video
-    print("🎞️ Extracting audio from video...")
-    aud.extract_audio_from_video("tempfile/vid.mp4", "tempfile/aud.wav")
-    print("✅ Audio extracted successfully!\n")
-
-    # 🎤 Step 2: Separate Vocals and Music
-    print("🎧 Wait a little longer... Audio separation in progress...")
-    sep.separate_audio("tempfile/aud.wav", "tempfile/aud")
-    print("✅ Audio separation complete!\n")
-
-    # 📝 Step 3: Transcribe Audio to Text
-    print("📝 Transcribing vocals...")
-    audio_file = "tempfile/aud/vocals.wav"
-    output_file = "tempfile/transcription.txt"
-    segments = transcribe.transcribe_with_local_whisper(audio_file, "medium")
-    transcribe.save_transcription(segments, output_file)
-    print(f"✅ Transcription complete: {audio_file} → {output_file}\n")
-
-    # 🌐 Step 4: Translate Transcription
-    translate.translate_transcript("tempfile/transcription.txt", translation_lan)
-    print("✅ Translation complete!\n")
-
-    # 🗣️ Step 5: Generate Dubbed Audio with Translation
-    print("🔊 Generating dubbed audio with translated text...")
-    input_file = f"tempfile/transcription_{translation_lan.replace(' ', '_')}.txt"
-    language = get_language_code(translation_lan)
-    temp_directory = "tempfile/dubbed_temp"
-    final_output = "tempfile/complete_dubbed.mp3"
-    dubbed.dub_text_with_timestamps(input_file, language, temp_directory, final_output)
-    print("✅ Dubbed audio generation complete!\n")
-
-    # 🎬 Step 6: Merge Audio Tracks and Add to Video
-    print("🎵 Merging dubbed audio and background music...")
-    video_path = "tempfile/vid.mp4"
-    dubbed_audio_path = "tempfile/complete_dubbed.mp3"
-    music_path = "tempfile/aud/music.wav"
-    combined_audio_path = "tempfile/temp-audio.m4a"
-    output_video_path = "output.mp4"
-    merged_audio = merge_aud.merge_audio_tracks(dubbed_audio_path, music_path, combined_audio_path)
-    if merged_audio:
-        print("🎥 Adding merged audio to the video...")
-        merge_aud.add_audio_to_video(video_path, merged_audio, output_video_path)
-        print(f"✅ Video with dubbed audio created successfully: {output_video_path}\n")
+    pipeline = build_pipeline(url, translation_lan.lower(), args.workdir, args.output, args.model_size, args.stream,
+                              transcribe_workers=args.transcribe_workers,
+                              transcription_engine=get_engine(args.transcribe_engine, args.model_size,
+                                                              threads=args.transcribe_threads,
+                                                              beam_size=args.beam_size, batch_size=args.batch_size))
+    force = set(args.force)
+    only = None
+    if selected is not None:
+        # A local source has no separate video stage; its download stage already copies vid.mp4
+        built = {stage.name for stage in pipeline.stages}
+        if args.command != "run" and args.command not in built:
+            parser.error(f"Stage '{args.command}' is not part of this pipeline; the source in {args.workdir} "
+                         "is a local file, so 'download' provides the video")
+        selected = [name for name in selected if name in built]
+        if not selected:
+            parser.error("None of the selected stages are part of this pipeline")
+        # Stages named on the command line are re-run on the existing artifacts
+        force |= set(selected)
+        only = set(selected)
+    if args.perf_report and not args.dry_run:
+        report = perf.enable(args.perf_report)
+        try:
+            with perf.measure("pipeline"):
+                pipeline.run(force=force, only=only)
+        finally:
+            # Extraction may have been skipped as up to date, so take the length from the video
+            video_path = os.path.join(args.workdir, "vid.mp4")
+            if report.audio_seconds is None and os.path.exists(video_path):
+                import media
+                perf.set_audio_seconds(media.probe_duration(video_path))
+            report.write()
     else:
-        print("❌ Failed to merge audio tracks!\n")
\ No newline at end of file
+        pipeline.run(force=force, dry_run=args.dry_run, only=only)
@@ -0,0 +1,236 @@
+import functools
+import os
+import re
+import shutil
+import subprocess
+import numpy as np
+from audio_buffer import AudioBuffer
+
+@functools.lru_cache(maxsize=None)
+def ffmpeg_binary():
+    """ffmpeg from the PATH, else the one MoviePy ships or locates (importing MoviePy is slow, so only then)"""
+    if shutil.which("ffmpeg"):
+        return "ffmpeg"
+    try:
+        from moviepy.config import FFMPEG_BINARY
+        return FFMPEG_BINARY
+    except ImportError:
+        return "ffmpeg"
+
+# Video codecs each output container can hold without re-encoding
+CONTAINER_VIDEO_CODECS = {
+    ".mp4": {"h264", "hevc", "av1", "mpeg4", "vp9"},
+    ".m4v": {"h264", "hevc", "mpeg4"},
+    ".mov": {"h264", "hevc", "mpeg4", "prores", "mjpeg"},
+    ".mkv": None,  # Matroska accepts any codec
+    ".webm": {"vp8", "vp9", "av1"},
+}
+
+# Audio codec to encode into each container when muxing a new track
+CONTAINER_AUDIO_CODECS = {
+    ".webm": "libopus",
+}
+
+def run_ffmpeg(args, input_data=None):
+    """Run ffmpeg with the given arguments and raise if it fails"""
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + list(args)
+    result = subprocess.run(cmd, input=input_data, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {result.stderr.decode(errors='replace').strip()}")
+    return result
+
+@functools.lru_cache(maxsize=64)
+def _probe_summary(path, signature):
+    result = subprocess.run([ffmpeg_binary(), "-hide_banner", "-i", path], capture_output=True)
+    return result.stderr.decode(errors="replace")
+
+def probe(path):
+    """
+    The stream summary ffmpeg prints for an input file, so no ffprobe is needed.
+    The probe_* helpers all parse it; it is cached while the file's size and mtime are unchanged.
+    """
+    try:
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+    except OSError:
+        signature = None
+    return _probe_summary(path, signature)
+
+def probe_streams(path):
+    """
+    Return the codecs of the streams in a media file.
+    Returns a dict like {"video": ["h264"], "audio": ["aac"]}.
+    """
+    info = probe(path)
+    if "No such file or directory" in info:
+        raise FileNotFoundError(path)
+
+    streams = {"video": [], "audio": []}
+    for kind, codec in re.findall(r"Stream #\d+:\d+.*?: (Video|Audio): (\w+)", info):
+        streams[kind.lower()].append(codec)
+    return streams
+
+def probe_duration(path):
+    """Return the duration of a media file in seconds, or None if ffmpeg doesn't report one"""
+    match = re.search(r"Duration: (\d+):(\d+):([\d.]+)", probe(path))
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def can_stream_copy(video_path, output_path):
+    """Check whether the video stream of video_path can be copied as-is into output_path's container"""
+    extension = "." + output_path.rsplit(".", 1)[-1].lower() if "." in output_path else ""
+    if extension not in CONTAINER_VIDEO_CODECS:
+        return False
+
+    video_codecs = probe_streams(video_path)["video"]
+    if not video_codecs:
+        return False
+
+    allowed = CONTAINER_VIDEO_CODECS[extension]
+    return allowed is None or video_codecs[0] in allowed
+
+def remux_audio(video_path, audio_path, output_path, audio_bitrate="192k"):
+    """
+    Replace the audio track of a video without touching its video stream.
+    The video stream is copied bit-for-bit; only the new audio is encoded.
+    """
+    extension = "." + output_path.rsplit(".", 1)[-1].lower()
+    audio_codec = CONTAINER_AUDIO_CODECS.get(extension, "aac")
+    run_ffmpeg([
+        "-i", video_path,
+        "-i", audio_path,
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        "-c:v", "copy",
+        "-c:a", audio_codec,
+        "-b:a", audio_bitrate,
+        output_path,
+    ])
+    return output_path
+
+# Channel counts of the layouts ffmpeg names in its stream summary
+CHANNEL_LAYOUTS = {"mono": 1, "stereo": 2, "2.1": 3, "quad": 4, "5.0": 5, "5.1": 6, "6.1": 7, "7.1": 8}
+
+def probe_audio_format(path):
+    """Return (sample_rate, channels) of the first audio stream of a media file"""
+    match = re.search(r"Stream #\d+:\d+.*?: Audio: [^\n]*?(\d+) Hz, ([\w.]+)( channels)?", probe(path))
+    if not match:
+        raise ValueError(f"No audio stream found in {path}")
+    rate, layout, counted = match.groups()
+    channels = int(layout) if counted else CHANNEL_LAYOUTS.get(layout.split("(")[0], 2)
+    return int(rate), channels
+
+def decode_audio(path, sample_rate=None, channels=None, start=None, duration=None):
+    """
+    Decode the audio of any media file straight to an AudioBuffer through ffmpeg.
+    ffmpeg resamples and remixes to sample_rate and channels when given.
+    With start and/or duration (seconds), only that part of the file is decoded.
+    """
+    if sample_rate is None or channels is None:
+        native_rate, native_channels = probe_audio_format(path)
+        sample_rate = sample_rate or native_rate
+        channels = channels or native_channels
+    window = (["-ss", f"{start:.6f}"] if start else []) + (["-t", f"{duration:.6f}"] if duration is not None else [])
+    result = run_ffmpeg([*window, "-i", path, "-vn", "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"])
+    samples = np.frombuffer(result.stdout, dtype="<f4").reshape(-1, channels).T
+    return AudioBuffer(samples, sample_rate)
+
+def decode_to_pcm_file(path, pcm_path, sample_rate, channels):
+    """
+    Decode the audio of a media file to a raw float32 PCM file and map it into memory.
+    Returns an AudioBuffer backed by the file, so long audio doesn't have to fit in RAM.
+    """
+    directory = os.path.dirname(pcm_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    run_ffmpeg(["-i", path, "-vn", "-map", "0:a:0", "-f", "f32le", "-ac", str(channels),
+                "-ar", str(sample_rate), pcm_path])
+    if os.path.getsize(pcm_path) == 0:
+        return AudioBuffer(np.zeros((channels, 0), dtype=np.float32), sample_rate)
+    samples = np.memmap(pcm_path, dtype="<f4", mode="r").reshape(-1, channels).T
+    return AudioBuffer(samples, sample_rate)
+
+def iter_pcm(path, sample_rate, channels, chunk_frames):
+    """
+    Decode the audio of a media file with one ffmpeg process, yielding (channels, frames)
+    float32 chunks as soon as ffmpeg produces them. Only the audio stream is decoded.
+    """
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-i", path, "-vn", "-map", "0:a:0",
+           "-f", "f32le", "-ac", str(channels), "-ar", str(sample_rate), "pipe:1"]
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    chunk_bytes = chunk_frames * channels * 4
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype="<f4").reshape(-1, channels).T.copy()
+        stderr = process.stderr.read()
+        if process.wait() != 0:
+            raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+    finally:
+        # The consumer may stop early (or fail); don't leave ffmpeg running
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+def _pcm_input(sample_rate, channels):
+    return ["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", "pipe:0"]
+
+def _feed_ffmpeg(args, chunks):
+    """
+    Run ffmpeg reading raw PCM on stdin, writing (channels, frames) float chunks as they come.
+    Nothing but the chunk being written is held in memory.
+    """
+    cmd = [ffmpeg_binary(), "-hide_banner", "-loglevel", "error", "-y"] + list(args)
+    process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        for chunk in chunks:
+            process.stdin.write(chunk.T.astype("<f4").tobytes())
+        process.stdin.close()
+    except BrokenPipeError:
+        # ffmpeg exited early; its error message is more useful than ours
+        pass
+    except BaseException:
+        process.kill()
+        process.wait()
+        raise
+    stderr = process.stderr.read()
+    if process.wait() != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()}")
+
+def encode_pcm(chunks, sample_rate, channels, output_path, audio_bitrate="192k"):
+    """Encode streamed PCM chunks to an audio file, with the codec picked from the extension"""
+    _feed_ffmpeg(_pcm_input(sample_rate, channels) + ["-b:a", audio_bitrate, output_path], chunks)
+    return output_path
+
+def _mux_args(video_path, audio_input, output_path, audio_bitrate):
+    extension = "." + output_path.rsplit(".", 1)[-1].lower()
+    audio_codec = CONTAINER_AUDIO_CODECS.get(extension, "aac")
+    video_codec = ["-c:v", "copy"] if can_stream_copy(video_path, output_path) else ["-c:v", "libx264"]
+    return [
+        "-i", video_path,
+        *audio_input,
+        "-map", "0:v:0",
+        "-map", "1:a:0",
+        *video_codec,
+        "-c:a", audio_codec,
+        "-b:a", audio_bitrate,
+        output_path,
+    ]
+
+def mux_pcm(video_path, chunks, sample_rate, channels, output_path, audio_bitrate="192k"):
+    """
+    Put streamed PCM chunks into a video as its audio track, without an intermediate audio file.
+    The video stream is copied when the output container allows it, otherwise re-encoded as H.264.
+    """
+    _feed_ffmpeg(_mux_args(video_path, _pcm_input(sample_rate, channels), output_path, audio_bitrate), chunks)
+    return output_path
+
+def mux_pcm_file(video_path, pcm_path, sample_rate, channels, output_path, audio_bitrate="192k"):
+    """Like mux_pcm, with the audio read by ffmpeg from a raw float32 PCM file"""
+    audio_input = ["-f", "f32le", "-ar", str(sample_rate), "-ac", str(channels), "-i", pcm_path]
+    run_ffmpeg(_mux_args(video_path, audio_input, output_path, audio_bitrate))
+    return output_path
@@ -1,6 +1,116 @@
-from moviepy import VideoFileClip, AudioFileClip, CompositeAudioClip
+import contextlib
+import os
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+import media
+from segments import changed_ranges, drop_snapshot, iter_segments, load_snapshot, merge_ranges, save_snapshot
+import perf
 
-def merge_audio_tracks(dubbed_audio_path, music_path, output_audio_path):
+# How far the music drops under dubbed speech, and the peak level the limiter holds the mix to
+DUCK_DB = -12.0
+LIMIT_CEILING = 0.98
+# How far an edit to the dubbed speech reaches into the mix: the ducking hold and ramp
+# plus the limiter's look-around, rounded up
+MIX_PAD_SECONDS = 1.0
+
+def speech_regions(segments_file):
+    """(start, end) times of the dubbed speech, from a segment store"""
+    return [(segment["start"], segment["end"]) for segment in iter_segments(segments_file, fields=("start", "end"))]
+
+def ducking_curve(regions, duration, duck_db=DUCK_DB, hold=0.15, ramp=0.3, control_rate=100):
+    """
+    Music gain (linear) sampled control_rate times per second: duck_db under speech,
+    held hold seconds around each region and faded in and out over ramp seconds.
+    """
+    n = int(np.ceil(duration * control_rate)) + 1
+    delta = np.zeros(n + 1, dtype=np.int32)
+    if len(regions):
+        bounds = np.asarray(regions, dtype=np.float64)
+        starts = np.clip(((bounds[:, 0] - hold) * control_rate).astype(int), 0, n)
+        ends = np.clip(np.ceil((bounds[:, 1] + hold) * control_rate).astype(int), 0, n)
+        np.add.at(delta, starts, 1)
+        np.add.at(delta, ends, -1)
+    mask = (np.cumsum(delta[:n]) > 0).astype(np.float32)
+    width = max(1, int(ramp * control_rate))
+    # Pad with the edge values so speech at the very start or end is ducked to full depth,
+    # and take the "valid" part so the curve keeps n points even when shorter than the ramp
+    mask = np.pad(mask, (width // 2, width - 1 - width // 2), mode="edge")
+    mask = np.convolve(mask, np.ones(width, dtype=np.float32) / width, mode="valid")
+    return (10 ** (mask * duck_db / 20)).astype(np.float32)
+
+def iter_mix(dubbed, music, regions=(), duck_db=DUCK_DB, ceiling=LIMIT_CEILING, chunk_seconds=10,
+             block=256, hold_blocks=8, control_rate=100, span=None, offset=0, frames=None):
+    """
+    Mix dubbed speech over ducked music and limit the result, yielding (channels, frames) chunks.
+    Both buffers must share a sample rate and channel count. The limiter works on block
+    peaks: each block gets the gain that keeps its peak under ceiling, held over
+    hold_blocks neighbours so the gain settles before a peak and recovers after it, and
+    interpolated per sample. Chunks are mixed with a little context on each side so the
+    limiter is seamless across chunk boundaries.
+
+    To redo part of a longer mix, pass buffers that start at frame offset of the track,
+    the track's total frames, and span=(first, last) frames to yield. first must be a
+    multiple of block and the buffers must reach (hold_blocks + 1) * block frames past
+    both ends of the span; the chunks then match the full mix exactly.
+    """
+    rate = music.sample_rate
+    if frames is None:
+        frames = offset + max(dubbed.samples.shape[1], music.samples.shape[1])
+    duck = ducking_curve(regions, frames / rate, duck_db, control_rate=control_rate)
+    # One block beyond the hold, since samples at a chunk edge interpolate towards the next block's gain
+    context = (hold_blocks + 1) * block
+    chunk = max(block, int(chunk_seconds * rate) // block * block)
+    first, last = span or (0, frames)
+
+    def mixed(start, end):
+        out = np.zeros((music.channels, end - start), dtype=np.float32)
+        speech = dubbed.samples[:, start - offset:end - offset]
+        out[:, :speech.shape[1]] += speech
+        background = music.samples[:, start - offset:end - offset]
+        gain = np.interp(np.arange(start, start + background.shape[1]) * (control_rate / rate),
+                         np.arange(len(duck)), duck).astype(np.float32)
+        out[:, :background.shape[1]] += background * gain
+        return out
+
+    for start in range(first, last, chunk):
+        end = min(start + chunk, last)
+        lo, hi = max(0, start - context), min(frames, end + context)
+        audio = mixed(lo, hi)
+
+        n_blocks = -(-audio.shape[1] // block)
+        padded = np.zeros((audio.shape[0], n_blocks * block), dtype=np.float32)
+        padded[:, :audio.shape[1]] = audio
+        peaks = np.abs(padded).reshape(audio.shape[0], n_blocks, block).max(axis=(0, 2))
+        gains = np.minimum(1.0, ceiling / np.maximum(peaks, 1e-9))
+        edge = np.pad(gains, hold_blocks, mode="edge")
+        gains = sliding_window_view(edge, 2 * hold_blocks + 1).min(axis=1)
+
+        centers = np.arange(n_blocks) * block + block / 2
+        gain = np.interp(np.arange(start - lo, end - lo), centers, gains).astype(np.float32)
+        yield np.clip(audio[:, start - lo:end - lo] * gain, -ceiling, ceiling)
+
+@contextlib.contextmanager
+def open_tracks(dubbed_audio_path, music_path, scratch_prefix):
+    """
+    Decode the dubbed track to the music stem's sample rate and channel count.
+    Both are decoded into memory-mapped float32 PCM files named after scratch_prefix
+    (removed again on exit), so iter_mix reads an hour of audio without holding it in RAM.
+    """
+    scratch = []
+    try:
+        sample_rate, channels = media.probe_audio_format(music_path)
+        scratch.append(scratch_prefix + ".music.pcm")
+        music = media.decode_to_pcm_file(music_path, scratch[-1], sample_rate, channels)
+        scratch.append(scratch_prefix + ".dub.pcm")
+        dubbed = media.decode_to_pcm_file(dubbed_audio_path, scratch[-1], music.sample_rate, music.channels)
+        yield dubbed, music
+    finally:
+        for path in scratch:
+            if os.path.exists(path):
+                os.remove(path)
+
+@perf.instrument("merge_audio_tracks")
+def merge_audio_tracks(dubbed_audio_path, music_path, output_audio_path, segments_file=None, duck_db=DUCK_DB):
     """
     Merge dubbed audio and background music into a single audio file.
     
@@ -8,23 +118,14 @@ def merge_audio_tracks(dubbed_audio_path, music_path, output_audio_path):
         dubbed_audio_path (str): Path to the main dubbed audio
         music_path (str): Path to the background music
         output_audio_path (str): Path for the output combined audio file
+        segments_file (str): Segment store with the speech timings; the music
+            is ducked under them when given
     """
     try:
-        # Load audio clips
-        dubbed_audio = AudioFileClip(dubbed_audio_path)
-        music_audio = AudioFileClip(music_path)
-        
-        # Combine the audio tracks
-        combined_audio = CompositeAudioClip([dubbed_audio, music_audio])
-        
-        # Write the combined audio to file
-        combined_audio.write_audiofile(output_audio_path, codec='aac')
-        
-        # Close clips to free resources
-        dubbed_audio.close()
-        music_audio.close()
-        combined_audio.close()
-        
+        regions = speech_regions(segments_file) if segments_file else ()
+        with open_tracks(dubbed_audio_path, music_path, output_audio_path) as (dubbed, music):
+            media.encode_pcm(iter_mix(dubbed, music, regions, duck_db), music.sample_rate, music.channels,
+                             output_audio_path)
         print(f"Successfully merged audio tracks to {output_audio_path}")
         return output_audio_path
         
@@ -32,7 +133,98 @@ def merge_audio_tracks(dubbed_audio_path, music_path, output_audio_path):
         print(f"Error merging audio tracks: {e}")
         return None
 
-def add_audio_to_video(video_path, audio_path, output_path):
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+def render_mix(dubbed_audio_path, music_path, mix_path, regions=(), duck_db=DUCK_DB):
+    """Mix the whole track into a raw float32 PCM file; returns (sample rate, channels)"""
+    with open_tracks(dubbed_audio_path, music_path, mix_path) as (dubbed, music), open(mix_path, "wb") as f:
+        for chunk in iter_mix(dubbed, music, regions, duck_db):
+            f.write(chunk.T.astype("<f4").tobytes())
+    return music.sample_rate, music.channels
+
+def patch_mix(mix_path, dubbed_audio_path, music_path, ranges, sample_rate, channels, regions=(), duck_db=DUCK_DB,
+              block=256):
+    """
+    Redo the given time ranges (grown by MIX_PAD_SECONDS) of a PCM mix written by render_mix, in place.
+    Only those parts of the dubbed and music tracks are decoded.
+    """
+    track = np.memmap(mix_path, dtype="<f4", mode="r+").reshape(-1, channels)
+    frames = len(track)
+    margin = int(MIX_PAD_SECONDS * sample_rate)
+    padded = merge_ranges([(start - MIX_PAD_SECONDS, end + MIX_PAD_SECONDS) for start, end in ranges])
+    for start, end in padded:
+        first = max(0, int(start * sample_rate) // block * block)
+        last = min(frames, int(np.ceil(end * sample_rate)))
+        if first >= last:
+            continue
+        lo, hi = max(0, first - margin), min(frames, last + margin)
+        window = {"start": lo / sample_rate, "duration": (hi - lo) / sample_rate}
+        dubbed = media.decode_audio(dubbed_audio_path, sample_rate, channels, **window)
+        music = media.decode_audio(music_path, sample_rate, channels, **window)
+        position = first
+        for chunk in iter_mix(dubbed, music, regions, duck_db, block=block, span=(first, last), offset=lo, frames=frames):
+            track[position:position + chunk.shape[1]] = chunk.T
+            position += chunk.shape[1]
+    track.flush()
+    return padded
+
+@perf.instrument("merge_into_video")
+def merge_into_video(video_path, dubbed_audio_path, music_path, output_path, segments_file=None, duck_db=DUCK_DB,
+                     mix_path=None):
+    """
+    Mix the dubbed speech over the ducked music and mux it into the video in one pass.
+    The mix is piped to ffmpeg as raw PCM, so no intermediate audio file is written or decoded again.
+
+    With a mix_path (a scratch file in the work directory) and a dubbed track that carries a
+    segment snapshot (see dubbed.dub_text_with_timestamps), the mix is kept there as raw PCM.
+    When only some segments changed since the last merge, just their time ranges are re-mixed
+    into that file before muxing. The video stream is still copied as a whole and the audio
+    encoded again from the PCM, which is quick next to re-mixing.
+    """
+    regions = speech_regions(segments_file) if segments_file else ()
+    dub = load_snapshot(dubbed_audio_path) if mix_path else None
+    if not dub:
+        # Nothing to patch against next time, so don't keep an hour-sized mix around
+        if mix_path:
+            drop_snapshot(mix_path)
+            if os.path.exists(mix_path):
+                os.remove(mix_path)
+        # Mixing and muxing run in one pass here; the mix dominates, so it is reported as the merge
+        with perf.measure("merge_audio_tracks"), \
+                open_tracks(dubbed_audio_path, music_path, mix_path or output_path) as (dubbed, music):
+            media.mux_pcm(video_path, iter_mix(dubbed, music, regions, duck_db), music.sample_rate, music.channels,
+                          output_path)
+        print(f"Successfully added dubbed audio to video at {output_path}")
+        return output_path
+
+    state = {"dub": dub, "music": _file_signature(music_path), "ducked": bool(segments_file),
+             "duck_db": duck_db, "ceiling": LIMIT_CEILING}
+    previous = load_snapshot(mix_path)
+    drop_snapshot(mix_path)
+    with perf.measure("merge_audio_tracks"):
+        if (previous and previous.get("dub") and os.path.exists(mix_path)
+                and all(previous.get(key) == state[key] for key in ("music", "ducked", "duck_db", "ceiling"))
+                and previous["dub"]["sample_rate"] == dub["sample_rate"]
+                and previous["dub"]["frames"] == dub["frames"]):
+            sample_rate, channels = previous["sample_rate"], previous["channels"]
+            ranges = changed_ranges(previous["dub"]["segments"], dub["segments"])
+            patched = patch_mix(mix_path, dubbed_audio_path, music_path, ranges, sample_rate, channels, regions,
+                                duck_db)
+            print(f"Re-mixed {sum(end - start for start, end in patched):.1f}s of audio in {len(patched)} changed ranges")
+        else:
+            sample_rate, channels = render_mix(dubbed_audio_path, music_path, mix_path, regions, duck_db)
+    state.update(sample_rate=sample_rate, channels=channels)
+
+    with perf.measure("add_audio_to_video"):
+        media.mux_pcm_file(video_path, mix_path, sample_rate, channels, output_path)
+    save_snapshot(mix_path, state)
+    print(f"Successfully added dubbed audio to video at {output_path}")
+    return output_path
+
+@perf.instrument("add_audio_to_video")
+def add_audio_to_video(video_path, audio_path, output_path, remux=True):
     """
     Add audio to a muted video.
     
@@ -40,7 +232,21 @@ def add_audio_to_video(video_path, audio_path, output_path):
         video_path (str): Path to the video file
         audio_path (str): Path to the audio file
         output_path (str): Path for the output video file
+        remux (bool): Copy the original video stream instead of re-encoding it.
+            Falls back to re-encoding when the codec doesn't fit the output container.
     """
+    if remux:
+        try:
+            if media.can_stream_copy(video_path, output_path):
+                media.remux_audio(video_path, audio_path, output_path)
+                print(f"Successfully added audio to video at {output_path} (video stream copied)")
+                return
+            print("Video codec not supported by the output container, re-encoding instead")
+        except Exception as e:
+            print(f"Stream copy failed, re-encoding instead: {e}")
+
+    from moviepy import VideoFileClip, AudioFileClip
+
     try:
         # Load video clip and mute it
         video_clip = VideoFileClip(video_path)
@@ -57,7 +263,7 @@ def add_audio_to_video(video_path, audio_path, output_path):
         final_video.write_videofile(output_path, 
                                    codec='libx264',
                                    audio_codec='aac', 
-                                   temp_audiofile="temp-audio.m4a", 
+                                   temp_audiofile=os.path.splitext(output_path)[0] + "-temp-audio.m4a", 
                                    remove_temp=True)
         
         # Close all clips
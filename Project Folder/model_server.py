@@ -0,0 +1,173 @@
+"""
+Long-lived worker that keeps Demucs and Whisper models loaded between jobs.
+
+Start it once:
+    python model_server.py --port 6000 --capacity 2
+
+Then point main.py at it with DUBAI_MODEL_SERVER=localhost:6000 and separation
+and transcription jobs run in the worker instead of loading models per run.
+
+Jobs arrive pickled, so anyone who can connect can run code in the worker. The
+server therefore only listens on the loopback interface or on a Unix socket
+(--socket /path, DUBAI_MODEL_SERVER=/path), and every connection must present the
+auth key: DUBAI_WORKER_AUTHKEY if set, otherwise a random key the server writes
+to ~/.dubai/worker.key (readable by its owner only) on first start.
+"""
+import argparse
+import os
+import secrets
+import threading
+import traceback
+from collections import OrderedDict
+from multiprocessing.connection import Client, Listener
+
+DEFAULT_ADDRESS = ("localhost", 6000)
+LOOPBACK_HOSTS = {"localhost", "127.0.0.1", "::1"}
+AUTHKEY_FILE = os.path.join(os.path.expanduser("~"), ".dubai", "worker.key")
+
+def _authkey(create=False):
+    """
+    The shared secret for server and clients. With create=True (the server) a missing
+    key file is generated; clients never invent a key.
+    """
+    key = os.environ.get("DUBAI_WORKER_AUTHKEY")
+    if key:
+        return key.encode()
+    if create and not os.path.exists(AUTHKEY_FILE):
+        os.makedirs(os.path.dirname(AUTHKEY_FILE), mode=0o700, exist_ok=True)
+        fd = os.open(AUTHKEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+        print(f"Generated a worker auth key in {AUTHKEY_FILE}")
+    try:
+        with open(AUTHKEY_FILE) as f:
+            return f.read().strip().encode()
+    except FileNotFoundError:
+        raise RuntimeError(f"No worker auth key: set DUBAI_WORKER_AUTHKEY or start model_server.py "
+                           f"once as this user to create {AUTHKEY_FILE}") from None
+
+def parse_address(address):
+    """Turn "host:port" into a (host, port) tuple; a path is kept as a Unix socket address"""
+    if os.sep in address:
+        return address
+    host, _, port = address.rpartition(":")
+    return (host or "localhost", int(port))
+
+def check_local(address):
+    """Refuse addresses other machines could connect to"""
+    if isinstance(address, tuple) and address[0] not in LOOPBACK_HOSTS:
+        raise ValueError(f"Refusing to serve on {address[0]}: the model server only listens on "
+                         f"loopback ({', '.join(sorted(LOOPBACK_HOSTS))}) or a Unix socket")
+    return address
+
+class ModelPool:
+    """Keep up to `capacity` loaded models, evicting the least recently used one"""
+
+    def __init__(self, capacity=2):
+        self.capacity = capacity
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, loader):
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+            print(f"Loading model {key}...")
+            model = loader()
+            self._models[key] = model
+            while len(self._models) > self.capacity:
+                evicted, _ = self._models.popitem(last=False)
+                print(f"Evicted model {evicted}")
+            return model
+
+class ModelServer:
+    """Serve separation and transcription jobs from a pool of warm models"""
+
+    def __init__(self, address=DEFAULT_ADDRESS, capacity=2):
+        self.address = check_local(address)
+        self.pool = ModelPool(capacity)
+        # Jobs share the CPU/GPU, so they run one at a time
+        self._job_lock = threading.Lock()
+
+    def handle(self, job):
+        op = job["op"]
+        if op == "ping":
+            return "pong"
+        # Heavy modules are imported on the first job rather than at server start-up
+        import sep
+        import transcribe
+
+        if op == "separate":
+            name = job.get("model", "htdemucs")
+            loaded = self.pool.get(("demucs", name), lambda: sep.load_model(name))
+            return sep.separate_audio_streaming(job["input_file"], job["output_dir"], loaded_model=loaded)
+        if op == "transcribe":
+            spec = {"name": "whisper", "model_size": job.get("model_size", "small"), **job.get("engine", {})}
+            engine = self.pool.get(("transcribe", tuple(sorted(spec.items()))),
+                                   lambda: transcribe.get_engine(**spec).load())
+            return transcribe.transcribe_parallel(job["audio"], spec["model_size"], workers=1, engine=engine)
+        raise ValueError(f"Unknown job type: {op}")
+
+    def _serve_connection(self, conn):
+        with conn:
+            while True:
+                try:
+                    job = conn.recv()
+                except EOFError:
+                    return
+                try:
+                    with self._job_lock:
+                        result = self.handle(job)
+                    conn.send({"ok": True, "result": result})
+                except Exception as e:
+                    traceback.print_exc()
+                    conn.send({"ok": False, "error": f"{type(e).__name__}: {e}"})
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=_authkey(create=True)) as listener:
+            where = self.address if isinstance(self.address, str) else f"{self.address[0]}:{self.address[1]}"
+            print(f"Model server listening on {where}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+class ModelClient:
+    """Send separation and transcription jobs to a running ModelServer"""
+
+    def __init__(self, address=DEFAULT_ADDRESS):
+        if isinstance(address, str):
+            address = parse_address(address)
+        self._conn = Client(address, authkey=_authkey())
+
+    def _call(self, job):
+        self._conn.send(job)
+        reply = self._conn.recv()
+        if not reply["ok"]:
+            raise RuntimeError(f"Model server error: {reply['error']}")
+        return reply["result"]
+
+    # Paths are sent absolute, since the server runs in its own working directory
+
+    def separate_audio(self, input_file, output_dir, model="htdemucs"):
+        return self._call({"op": "separate", "input_file": os.path.abspath(input_file),
+                           "output_dir": os.path.abspath(output_dir), "model": model})
+
+    def transcribe(self, audio, model_size="small", engine=None):
+        """engine is a TranscriptionEngine.spec() to transcribe with instead of openai-whisper"""
+        if isinstance(audio, str):
+            audio = os.path.abspath(audio)
+        return self._call({"op": "transcribe", "audio": audio, "model_size": model_size, "engine": engine or {}})
+
+    def close(self):
+        self._conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Keep Demucs and Whisper loaded between jobs")
+    parser.add_argument("--host", default=DEFAULT_ADDRESS[0], choices=sorted(LOOPBACK_HOSTS),
+                        help="Loopback address to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_ADDRESS[1])
+    parser.add_argument("--socket", help="Listen on this Unix socket path instead of a TCP port")
+    parser.add_argument("--capacity", type=int, default=2, help="How many models to keep loaded")
+    args = parser.parse_args()
+    ModelServer(args.socket or (args.host, args.port), args.capacity).serve_forever()
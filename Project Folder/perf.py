@@ -0,0 +1,213 @@
+import functools
+import json
+import os
+import platform
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf")]
+
+_report = None
+
+def _read_proc(path, fields):
+    """Read "name: value" fields from a /proc file as ints, or None where unavailable"""
+    try:
+        with open(path) as f:
+            values = dict(line.split(":", 1) for line in f if ":" in line)
+        return {field: int(values[field].split()[0]) for field in fields}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _rss_bytes():
+    status = _read_proc("/proc/self/status", ["VmRSS"])
+    if status:
+        return status["VmRSS"] * 1024
+    if resource:
+        # Peak rather than current, but the best we have without /proc
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * (1 if platform.system() == "Darwin" else 1024)
+    return None
+
+def _cpu_seconds():
+    """CPU time of this process plus finished child processes (ffmpeg)"""
+    total = time.process_time()
+    if resource:
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        total += children.ru_utime + children.ru_stime
+    return total
+
+def _io_bytes():
+    return _read_proc("/proc/self/io", ["read_bytes", "write_bytes"])
+
+class _RssSampler(threading.Thread):
+    """Track the peak resident set size while a stage runs"""
+
+    def __init__(self, interval=0.05):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.peak = _rss_bytes()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            rss = _rss_bytes()
+            if rss is not None and (self.peak is None or rss > self.peak):
+                self.peak = rss
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+        return self.peak
+
+class RunReport:
+    """Collects per-stage metrics and latency samples for one run"""
+
+    def __init__(self, path=None):
+        self.path = path
+        self.started = datetime.now(timezone.utc).isoformat()
+        self.audio_seconds = None
+        self.stages = []
+        self.latencies = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        io_before = _io_bytes()
+        cpu_before = _cpu_seconds()
+        sampler = _RssSampler()
+        sampler.start()
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            wall = time.perf_counter() - start
+            peak = sampler.stop()
+            io_after = _io_bytes()
+            entry = {
+                "name": name,
+                "wall_seconds": round(wall, 3),
+                "cpu_seconds": round(_cpu_seconds() - cpu_before, 3),
+                "peak_rss_mb": round(peak / 2 ** 20, 1) if peak else None,
+                "read_bytes": io_after["read_bytes"] - io_before["read_bytes"] if io_before and io_after else None,
+                "write_bytes": io_after["write_bytes"] - io_before["write_bytes"] if io_before and io_after else None,
+            }
+            if error:
+                entry["error"] = error
+            with self._lock:
+                self.stages.append(entry)
+
+    def record_stage(self, name, wall_seconds):
+        """Add a stage timed by the caller, for work interleaved with another stage"""
+        entry = {"name": name, "wall_seconds": round(wall_seconds, 3), "cpu_seconds": None, "peak_rss_mb": None,
+                 "read_bytes": None, "write_bytes": None}
+        with self._lock:
+            self.stages.append(entry)
+
+    def record_latency(self, name, seconds):
+        with self._lock:
+            self.latencies.setdefault(name, []).append(seconds)
+
+    def to_dict(self):
+        with self._lock:
+            stages = [dict(stage) for stage in self.stages]
+            latencies = {name: list(samples) for name, samples in self.latencies.items()}
+        for stage in stages:
+            # Seconds of source audio processed per wall-clock second
+            stage["real_time_factor"] = (round(self.audio_seconds / stage["wall_seconds"], 2)
+                                         if self.audio_seconds and stage["wall_seconds"] else None)
+        return {
+            "started": self.started,
+            "host": platform.node(),
+            "audio_seconds": self.audio_seconds,
+            "stages": stages,
+            "latency": {name: summarize_latencies(samples) for name, samples in latencies.items()},
+        }
+
+    def write(self, path=None):
+        path = path or self.path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2)
+        print(f"📊 Performance report written to {path}")
+        return path
+
+def summarize_latencies(samples):
+    """Count, percentiles and bucketed histogram of latency samples in seconds"""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))], 4)
+
+    histogram = {}
+    for bound in LATENCY_BUCKETS:
+        label = f"<={bound}s" if bound != float("inf") else f">{LATENCY_BUCKETS[-2]}s"
+        histogram[label] = sum(1 for sample in ordered if sample <= bound) - sum(histogram.values())
+    return {
+        "count": len(ordered),
+        "mean": round(sum(ordered) / len(ordered), 4),
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": round(ordered[-1], 4),
+        "histogram": histogram,
+    }
+
+def enable(path=None):
+    """Start collecting metrics for this process; returns the RunReport"""
+    global _report
+    _report = RunReport(path)
+    return _report
+
+def disable():
+    global _report
+    _report = None
+
+def current_report():
+    return _report
+
+def set_audio_seconds(seconds):
+    """Record the source audio length, used for real-time factors"""
+    if _report is not None and seconds:
+        _report.audio_seconds = seconds
+
+def record_latency(name, seconds):
+    if _report is not None:
+        _report.record_latency(name, seconds)
+
+def record_stage(name, wall_seconds):
+    if _report is not None:
+        _report.record_stage(name, wall_seconds)
+
+@contextmanager
+def measure(name):
+    """Measure a block as a stage; does nothing unless reporting is enabled"""
+    if _report is None:
+        yield
+    else:
+        with _report.measure(name):
+            yield
+
+def instrument(name):
+    """Decorator measuring every call of a function as the stage `name`"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _report is None:
+                return func(*args, **kwargs)
+            with _report.measure(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
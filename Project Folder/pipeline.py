@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+
+def hash_file(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+class Stage:
+    """
+    One step of the pipeline.
+    run is called with no arguments and must produce every path in outputs.
+    inputs are files read by the stage and params anything else its result depends on
+    (model name, language, ...). Dependencies on other stages follow from which stage
+    produces each input file.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), params=None, resource=None):
+        self.name = name
+        self.run = run
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.params = params or {}
+        # Kind of work ("cpu" or "io"), used to limit how many such stages run at once
+        self.resource = resource
+
+class Pipeline:
+    """
+    Run stages in dependency order, skipping those whose inputs and parameters are
+    unchanged since their outputs were last produced.
+    Each stage's record in the state file holds a hash of its input file contents and
+    parameters, so a stage only re-runs when something it depends on really changed.
+    """
+
+    def __init__(self, stages, state_path):
+        self.stages = stages
+        self.state_path = state_path
+        self.state = {"stages": {}, "files": {}}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                self.state = json.load(f)
+
+        self.producers = {}
+        for stage in stages:
+            for path in stage.outputs:
+                self.producers[path] = stage.name
+        for stage in stages:
+            for path in stage.inputs:
+                producer = self.producers.get(path)
+                if producer and [s.name for s in stages].index(producer) > stages.index(stage):
+                    raise ValueError(f"Stage '{stage.name}' comes before '{producer}', which produces {path}")
+
+    def _save_state(self):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def file_hash(self, path):
+        """Content hash of a file, reusing the stored hash while its size and mtime are unchanged"""
+        stat = os.stat(path)
+        cached = self.state["files"].get(path)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            return cached["sha256"]
+        digest = hash_file(path)
+        self.state["files"][path] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+        return digest
+
+    def fingerprint(self, stage):
+        data = {
+            "params": stage.params,
+            "inputs": {path: self.file_hash(path) for path in stage.inputs},
+        }
+        return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()
+
+    @staticmethod
+    def record_key(stage):
+        # Outputs are part of the key so per-language variants of a stage keep separate records
+        return f"{stage.name}:{'|'.join(stage.outputs)}"
+
+    def dependencies(self, stage):
+        return {self.producers[path] for path in stage.inputs if path in self.producers}
+
+    def plan(self, force=(), only=None):
+        """
+        Decide what each stage would do, without running anything.
+        Returns a list of (stage name, action, reason); action is "run" or "skip".
+        """
+        plan = []
+        pending = set()
+        for stage in self.stages:
+            if only is not None and stage.name not in only:
+                plan.append((stage.name, "skip", "not selected"))
+                continue
+            reason = self._stale_reason(stage, force, pending)
+            if reason:
+                pending.add(stage.name)
+                plan.append((stage.name, "run", reason))
+            else:
+                plan.append((stage.name, "skip", "up to date"))
+        return plan
+
+    def _stale_reason(self, stage, force, pending):
+        if stage.name in force or "all" in force:
+            return "forced"
+        upstream = self.dependencies(stage) & pending
+        if upstream:
+            return f"upstream stage {', '.join(sorted(upstream))} will run"
+        record = self.state["stages"].get(self.record_key(stage))
+        if record is None:
+            return "never run"
+        missing = [path for path in stage.outputs if not os.path.exists(path)]
+        if missing:
+            return f"missing output {missing[0]}"
+        missing = [path for path in stage.inputs if not os.path.exists(path)]
+        if missing:
+            return f"missing input {missing[0]}"
+        if record["fingerprint"] != self.fingerprint(stage):
+            return "inputs or parameters changed"
+        return None
+
+    def run(self, force=(), dry_run=False, limits=None, only=None):
+        """
+        Run every stale stage in order. force is a set of stage names (or "all") to re-run regardless.
+        limits maps a stage resource kind to a semaphore held while such a stage runs,
+        so concurrent pipelines can share CPU-heavy and I/O-bound capacity.
+        only restricts the run to a set of stage names; the rest are left alone and the
+        selected stages work on whatever artifacts earlier runs left behind.
+        """
+        if dry_run:
+            for name, action, reason in self.plan(force, only):
+                print(f"{'RUN ' if action == 'run' else 'skip'}  {name:<12} {reason}")
+            return
+
+        for stage in self.stages:
+            if only is not None and stage.name not in only:
+                continue
+            missing = [path for path in stage.inputs if not os.path.exists(path)]
+            if missing:
+                producer = self.producers.get(missing[0])
+                hint = f"; run the '{producer}' stage first" if producer else ""
+                raise RuntimeError(f"Stage '{stage.name}' needs {missing[0]}{hint}")
+
+            # Upstream stages have already run at this point, so staleness is decided on real hashes
+            reason = self._stale_reason(stage, force, set())
+            if not reason:
+                print(f"⏭️ Skipping {stage.name} (up to date)")
+                continue
+
+            print(f"▶️ Running {stage.name} ({reason})")
+            limit = (limits or {}).get(stage.resource)
+            if limit is not None:
+                with limit:
+                    stage.run()
+            else:
+                stage.run()
+            missing = [path for path in stage.outputs if not os.path.exists(path)]
+            if missing:
+                raise RuntimeError(f"Stage '{stage.name}' did not produce {missing[0]}")
+
+            self.state["stages"][self.record_key(stage)] = {
+                "fingerprint": self.fingerprint(stage),
+                "outputs": {path: self.file_hash(path) for path in stage.outputs},
+            }
+            self._save_state()
@@ -0,0 +1,180 @@
+"""
+Segment store shared by the transcription, translation and dubbing stages.
+
+A store is a JSON Lines file. The first line is a header naming the schema
+version and what the file holds, e.g.
+    {"schema": "dubai-segments", "version": 1, "kind": "translation", "language": "hindi"}
+and every further line is one segment:
+    {"id": 0, "start": 0.0, "end": 2.48, "text": "Hello there",
+     "words": [[0.0, 0.42, " Hello"], [0.42, 2.48, " there"]],
+     "translations": {"hindi": "नमस्ते"}, "status": {"translate": "ok"}}
+Only "id" is required; each stage writes the fields it produces and reads the ones
+it needs. The transcribe stage writes text and word timings, the translate stage
+writes a translation layer with the segment timings, translations and status.
+Files are written line by line and read with an iterator, so long transcripts are
+never held or parsed whole.
+
+Rendered tracks (the dubbed speech, the final mix) keep a snapshot of the segments
+they were built from next to them, as {segment id: {"start", "end", "key"}}.
+changed_ranges() diffs two snapshots into the time ranges that need redoing, so a
+few edited lines only cost the seconds they cover.
+
+Print a store as text:
+    python segments.py tempfile/transcription_hindi.jsonl
+"""
+import json
+import os
+import sys
+
+SCHEMA = "dubai-segments"
+SCHEMA_VERSION = 1
+
+class SegmentWriter:
+    """
+    Append segments to a new store. The file appears under its final name only once
+    the writer is closed, so an interrupted stage never leaves a partial store behind.
+    """
+
+    def __init__(self, path, kind, **header):
+        self.path = path
+        self._tmp_path = path + ".tmp"
+        self._next_id = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self._tmp_path, "w", encoding="utf-8")
+        self._write({"schema": SCHEMA, "version": SCHEMA_VERSION, "kind": kind, **header})
+
+    def _write(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def write(self, segment):
+        """Append one segment; ids are assigned in order unless the segment carries one"""
+        record = {"id": segment.get("id", self._next_id)}
+        for field, value in segment.items():
+            if field in ("start", "end") and value is not None:
+                value = round(float(value), 3)
+            if value is not None and field != "id":
+                record[field] = value
+        self._next_id = record["id"] + 1
+        self._write(record)
+        # Keep the file current so a reader can follow a long run
+        self._file.flush()
+        return record["id"]
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+            os.replace(self._tmp_path, self.path)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+            os.remove(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+def write_segments(path, segments, kind, **header):
+    """Write a whole list (or iterable) of segments to a new store"""
+    with SegmentWriter(path, kind, **header) as writer:
+        for segment in segments:
+            writer.write(segment)
+    return path
+
+def _check_header(path, header):
+    if header.get("schema") != SCHEMA:
+        raise ValueError(f"{path} is not a segment store")
+    if header.get("version", 0) > SCHEMA_VERSION:
+        raise ValueError(f"{path} uses segment schema version {header['version']}; "
+                         f"this version of DubAI reads up to {SCHEMA_VERSION}")
+
+def read_header(path):
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+    _check_header(path, header)
+    return header
+
+def iter_segments(path, fields=None):
+    """
+    Yield the segments of a store one at a time.
+    With fields, each segment is cut down to "id" plus those fields.
+    """
+    with open(path, encoding="utf-8") as f:
+        header = json.loads(f.readline() or "{}")
+        _check_header(path, header)
+        for line in f:
+            if not line.strip():
+                continue
+            segment = json.loads(line)
+            if fields is not None:
+                segment = {field: segment[field] for field in ("id", *fields) if field in segment}
+            yield segment
+
+def words_from_whisper(segment, offset=0.0):
+    """Compact [start, end, word] triples from a Whisper segment with word timestamps"""
+    return [[round(word["start"] + offset, 3), round(word["end"] + offset, 3), word["word"]]
+            for word in segment.get("words") or []]
+
+def merge_ranges(ranges):
+    """Sort (start, end) time ranges and merge the ones that overlap or touch"""
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def changed_ranges(old, new):
+    """
+    Time ranges affected between two snapshots of a track's segments.
+    Snapshots map segment id to {"start", "end", "key"}, where key identifies the content
+    placed there. A segment that was added, removed, moved or re-keyed dirties both its
+    old and its new time range.
+    """
+    ranges = []
+    for segment_id in set(old) | set(new):
+        before, after = old.get(segment_id), new.get(segment_id)
+        if before == after:
+            continue
+        for entry in (before, after):
+            if entry is not None:
+                ranges.append((entry["start"], entry["end"]))
+    return merge_ranges(ranges)
+
+def snapshot_path(track):
+    """Where the segment snapshot a rendered track was built from is kept"""
+    return track + ".state.json"
+
+def load_snapshot(track):
+    """The snapshot saved with track, or None if there is none (or it is unreadable)"""
+    try:
+        with open(snapshot_path(track), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def save_snapshot(track, state):
+    path = snapshot_path(track)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+def drop_snapshot(track):
+    """Forget a track's snapshot before patching it, so an interrupted patch forces a full rebuild"""
+    if os.path.exists(snapshot_path(track)):
+        os.remove(snapshot_path(track))
+
+if __name__ == "__main__":
+    store = sys.argv[1]
+    language = read_header(store).get("language")
+    for segment in iter_segments(store):
+        text = segment.get("translations", {}).get(language, segment.get("text", ""))
+        print(f"[{segment.get('start', 0):.2f} - {segment.get('end', 0):.2f}]  {text}")
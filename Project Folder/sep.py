@@ -3,50 +3,155 @@ import torch
 from demucs.pretrained import get_model
 from demucs.audio import AudioFile, save_audio
 from demucs.apply import apply_model
+from audio_buffer import WavWriter
+import aud
+import perf
 
-def separate_audio(input_file, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
-    
+# Rough working-set estimate for windowed separation on CPU: the input window, the
+# per-source outputs and apply_model's accumulation buffers, per second of audio,
+# plus a fixed cost for the model weights and activations
+BYTES_PER_SAMPLE_SECOND = 12 * 4
+MODEL_OVERHEAD_BYTES = 1024 * 1024 * 1024
+MIN_WINDOW_SECONDS = 20
+
+def load_model(name="htdemucs"):
+    """Load a Demucs model onto the best available device, returning (model, device)"""
     # Load model (htdemucs is the latest model with good separation quality)
-    model = get_model("htdemucs")
+    model = get_model(name)
     device = "cuda" if torch.cuda.is_available() else "cpu"
     model.to(device)
-    
-    # Load audio file
-    wav = AudioFile(input_file).read(streams=0, samplerate=model.samplerate, channels=model.audio_channels)
+    return model, device
+
+def _separate(model, device, wav):
+    """Run the model on a (channels, frames) tensor and return (vocals, music) tensors"""
     ref = wav.mean(0)
-    wav = (wav - ref.mean()) / ref.std()
-    
+    # The epsilon keeps fully silent input (e.g. a quiet window of a long track) from dividing by zero
+    std = ref.std() + 1e-8
+    wav = (wav - ref.mean()) / std
+
     # Apply separation - use apply_model instead of model.forward
     with torch.no_grad():
         sources = apply_model(model, wav[None], device=device)
-    sources = sources * ref.std() + ref.mean()
-    
-    # Save each source in output directory
-    track_name = os.path.splitext(os.path.basename(input_file))[0]
-    track_dir = output_dir
-    os.makedirs(track_dir, exist_ok=True)
-    
+    sources = sources * std + ref.mean()
+
     # Get the index of vocals from the model sources
     sources_list = model.sources
     vocals_idx = sources_list.index('vocals')
-    
-    # Save vocals track
     vocals = sources[0][vocals_idx]
-    vocals_path = os.path.join(track_dir, "vocals.wav")
-    save_audio(vocals, vocals_path, model.samplerate)
-    
-    # Create and save music track (everything except vocals)
+
+    # Create music track (everything except vocals)
     # Start with zeros, then add all non-vocal sources
     music = torch.zeros_like(vocals)
     for i, source_name in enumerate(sources_list):
         if source_name != 'vocals':
             music += sources[0][i]
-    
+
+    return vocals, music
+
+@perf.instrument("separate_audio")
+def separate_audio(input_file, output_dir, loaded_model=None):
+    """Separate input_file into vocals.wav and music.wav; loaded_model is an optional (model, device) from load_model()"""
+    os.makedirs(output_dir, exist_ok=True)
+
+    model, device = loaded_model or load_model()
+
+    # Load audio file
+    wav = AudioFile(input_file).read(streams=0, samplerate=model.samplerate, channels=model.audio_channels)
+    vocals, music = _separate(model, device, wav)
+
+    # Save each source in output directory
+    track_dir = output_dir
+    os.makedirs(track_dir, exist_ok=True)
+
+    # Save vocals track
+    vocals_path = os.path.join(track_dir, "vocals.wav")
+    save_audio(vocals, vocals_path, model.samplerate)
+
     music_path = os.path.join(track_dir, "music.wav")
     save_audio(music, music_path, model.samplerate)
-    
+
     print(f"Separation complete! Files saved to {track_dir}")
-    
-    
-# separate_audio("tempfile/aud.wav", "tempfile/aud")
\ No newline at end of file
+
+def window_seconds_for_memory(max_memory_mb, samplerate, channels):
+    """Pick the largest window length (seconds) that keeps separation under max_memory_mb"""
+    usable = max_memory_mb * 1024 * 1024 - MODEL_OVERHEAD_BYTES
+    per_second = BYTES_PER_SAMPLE_SECOND * samplerate * channels
+    return max(MIN_WINDOW_SECONDS, usable / per_second)
+
+def iter_file_chunks(input_file, samplerate, channels, chunk_seconds):
+    """
+    Decode the audio of any media file (a video works too) chunk by chunk as (channels, frames)
+    tensors. A single ffmpeg process decodes straight to PCM at the model's rate, so
+    separation of the first window starts while the rest is still being decoded.
+    """
+    for chunk in aud.iter_audio_chunks(input_file, samplerate, channels, chunk_seconds):
+        yield torch.from_numpy(chunk)
+
+def iter_windows(chunks, window, overlap):
+    """Re-cut a stream of (channels, frames) chunks into windows of `window` frames overlapping by `overlap`"""
+    buffer = None
+    emitted = False
+    for chunk in chunks:
+        buffer = chunk if buffer is None else torch.cat([buffer, chunk], dim=-1)
+        while buffer.shape[-1] >= window:
+            yield buffer[:, :window]
+            emitted = True
+            buffer = buffer[:, window - overlap:]
+    # Whatever is left only matters if it holds frames no window has covered yet
+    if buffer is not None and (buffer.shape[-1] > overlap or not emitted):
+        yield buffer
+
+@perf.instrument("separate_audio")
+def separate_audio_streaming(input_file, output_dir, max_memory_mb=4096, num_threads=None, overlap_seconds=2.0, loaded_model=None):
+    """
+    Separate long audio into vocals.wav and music.wav in bounded memory.
+    input_file can be an audio file or the video itself. The input is decoded and separated in overlapping windows sized to stay under
+    max_memory_mb; window boundaries are crossfaded and both stems are written to
+    disk as each window finishes. The non-vocal stems are summed per window.
+    num_threads sets the number of CPU threads torch uses. overlap_seconds=0 butts the
+    windows together without crossfades.
+    """
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    os.makedirs(output_dir, exist_ok=True)
+
+    model, device = loaded_model or load_model()
+    samplerate, channels = model.samplerate, model.audio_channels
+    window = int(window_seconds_for_memory(max_memory_mb, samplerate, channels) * samplerate)
+    overlap = int(overlap_seconds * samplerate)
+    # Each window has to move the stream forward, or iter_windows never gets past the first one
+    if not 0 <= overlap < window:
+        raise ValueError(f"overlap_seconds must be at least 0 and shorter than the {window / samplerate:.0f}s "
+                         f"window, got {overlap_seconds}")
+    print(f"Separating in {window / samplerate:.0f}s windows with {overlap_seconds}s crossfades")
+
+    fade_in = torch.linspace(0, 1, overlap)
+    fade_out = 1 - fade_in
+    tails = None
+    chunks = iter_file_chunks(input_file, samplerate, channels, chunk_seconds=min(60, window / samplerate))
+
+    with WavWriter(os.path.join(output_dir, "vocals.wav"), samplerate, channels) as vocals_out, \
+         WavWriter(os.path.join(output_dir, "music.wav"), samplerate, channels) as music_out:
+        writers = (vocals_out, music_out)
+        for segment in iter_windows(chunks, window, overlap):
+            stems = [stem.cpu() for stem in _separate(model, device, segment)]
+
+            # Crossfade the start of this window with the end of the previous one
+            if tails is not None:
+                for stem, tail in zip(stems, tails):
+                    stem[:, :overlap] = tail * fade_out + stem[:, :overlap] * fade_in
+
+            # Hold back the last overlap frames (none without crossfades); the next window fades into them
+            cut = max(0, stems[0].shape[-1] - overlap)
+            for stem, writer in zip(stems, writers):
+                writer.write(stem[:, :cut].numpy())
+            tails = [stem[:, cut:] for stem in stems]
+
+        if tails is not None:
+            for tail, writer in zip(tails, writers):
+                writer.write(tail.numpy())
+
+    print(f"Separation complete! Files saved to {output_dir}")
+
+
+# separate_audio("tempfile/aud.wav", "tempfile/aud")
@@ -0,0 +1,145 @@
+import queue
+import threading
+import transcribe
+import translate
+import dubbed
+import perf
+from segments import SegmentWriter, drop_snapshot, save_snapshot
+from translation_backends import GeminiBackend
+from tts_engines import GTTSEngine
+
+# Marks the end of a stream in the queues between stages
+_DONE = object()
+
+def _drain_batch(source, max_items, stop):
+    """Block for one item, then take whatever else is already waiting, up to max_items"""
+    while True:
+        if stop.is_set():
+            return [_DONE]
+        try:
+            items = [source.get(timeout=0.5)]
+            break
+        except queue.Empty:
+            continue
+    while len(items) < max_items and items[-1] is not _DONE:
+        try:
+            items.append(source.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+def _put(target, item, stop):
+    """Put an item on a bounded queue; returns False if another stage has failed in the meantime"""
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+class _Stage(threading.Thread):
+    """Worker thread that records its exception and signals the other stages to stop on failure"""
+
+    def __init__(self, target, stop):
+        super().__init__(daemon=True)
+        self._target = target
+        self._stop_event = stop
+        self.error = None
+
+    def run(self):
+        try:
+            self._target()
+        except BaseException as e:
+            self.error = e
+            self._stop_event.set()
+
+@perf.instrument("stream_dub")
+def stream_dub(vocals, translation_lan, language, transcript_file, translation_file, dubbed_output,
+               model_size="small", model=None, backend=None, engine=None, transcription_engine=None,
+               translation_cache=None, tts_cache=None, queue_size=16, batch_size=8, tts_workers=4):
+    """
+    Transcribe, translate and synthesize speech at the same time.
+    Whisper yields segments chunk by chunk; they flow through bounded queues into
+    translation and then into TTS and duration adjustment, so the three stages overlap.
+    A full queue blocks the stage feeding it, so a fast stage never runs far ahead.
+    Writes the same transcript and translation stores and dubbed track as the sequential
+    stages; the stores are appended to as segments arrive.
+    """
+    backend = backend or GeminiBackend()
+    engine = engine or GTTSEngine()
+    transcribed = queue.Queue(maxsize=queue_size)
+    translated = queue.Queue(maxsize=queue_size)
+    placements, dubbed_segments = [], []
+    stop = threading.Event()
+    transcript_writer = SegmentWriter(transcript_file, "transcript")
+    translation_writer = SegmentWriter(translation_file, "translation", language=translation_lan)
+
+    def transcribe_stage():
+        for raw in transcribe.iter_transcription(vocals, model_size, model, engine=transcription_engine):
+            segment = transcribe.to_store_segment(raw)
+            segment["id"] = transcript_writer.write(segment)
+            if not _put(transcribed, segment, stop):
+                return
+            print(f"📝 [{segment['start']:.2f} - {segment['end']:.2f}] {segment['text']}")
+        _put(transcribed, _DONE, stop)
+
+    def translate_stage():
+        while True:
+            batch = _drain_batch(transcribed, batch_size, stop)
+            done = batch[-1] is _DONE
+            segments = [segment for segment in batch if segment is not _DONE]
+            if segments:
+                texts = [segment["text"] for segment in segments]
+                translated_texts = translate.translate_cached(texts, translation_lan, backend, translation_cache)
+                for segment, text in zip(segments, translated_texts):
+                    record = translate.translation_record(segment, translation_lan, text)
+                    translation_writer.write(record)
+                    if not _put(translated, record, stop):
+                        return
+            if done:
+                _put(translated, _DONE, stop)
+                return
+
+    def dub_stage():
+        while True:
+            batch = _drain_batch(translated, batch_size, stop)
+            done = batch[-1] is _DONE
+            segments = [segment for segment in batch if segment is not _DONE]
+            if segments:
+                texts = [segment["translations"][translation_lan] for segment in segments]
+                speeches = dubbed.synthesize_segments(texts, language, engine, max_workers=tts_workers, cache=tts_cache)
+                adjusted = dubbed.adjust_durations(speeches, [s["end"] - s["start"] for s in segments])
+                placements.extend((segment["start"], samples) for segment, samples in zip(segments, adjusted))
+                dubbed_segments.extend((segment["id"], segment["start"], segment["end"], text)
+                                       for segment, text in zip(segments, texts))
+                print(f"🗣️ Dubbed {len(placements)} segments so far")
+            if done:
+                return
+
+    stages = [
+        _Stage(transcribe_stage, stop),
+        _Stage(translate_stage, stop),
+        _Stage(dub_stage, stop),
+    ]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+    for stage in stages:
+        if stage.error is not None:
+            transcript_writer.abort()
+            translation_writer.abort()
+            raise stage.error
+
+    if tts_cache is not None:
+        tts_cache.evict()
+    transcript_writer.close()
+    translation_writer.close()
+    print(f"Transcript saved to {transcript_file}, translation to {translation_file}")
+    drop_snapshot(dubbed_output)
+    dubbed.export_dubbed_audio(placements, max((end for _, _, end, _ in dubbed_segments), default=0), dubbed_output)
+    if dubbed_output.endswith(".wav"):
+        # Lets a later dub stage redo only the segments a reviewer edits
+        save_snapshot(dubbed_output, dubbed.dub_snapshot(dubbed_segments, language, engine))
+    return dubbed_output
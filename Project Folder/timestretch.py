@@ -0,0 +1,111 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def _wsola_params(sample_rate, frame_ms, tolerance_ms):
+    # Synthesis hop is half a frame; a periodic Hann window then overlap-adds to exactly 1
+    hop = max(1, int(sample_rate * frame_ms / 2000))
+    tolerance = max(1, int(sample_rate * tolerance_ms / 1000))
+    window = np.hanning(2 * hop + 1)[:-1].astype(np.float32)
+    return hop, tolerance, window
+
+def time_stretch_batch(signals, rates, sample_rate=24000, frame_ms=30, tolerance_ms=8, group_size=16):
+    """
+    Pitch-preserving time-stretch of many mono signals at once using WSOLA
+    (waveform similarity overlap-add).
+
+    signals is a list of 1-D float arrays and rates the playback speed for each:
+    rate > 1 makes the signal shorter (faster), rate < 1 longer (slower).
+    Signals of similar output length are processed together in groups of group_size,
+    so the Python-level loop runs once per output frame of a group rather than
+    once per frame per signal.
+    Returns a list of float32 arrays of length round(len(signal) / rate).
+    """
+    hop, tolerance, window = _wsola_params(sample_rate, frame_ms, tolerance_ms)
+    out_lengths = [round(len(signal) / rate) for signal, rate in zip(signals, rates)]
+    order = sorted(range(len(signals)), key=lambda i: out_lengths[i])
+
+    results = [None] * len(signals)
+    for first in range(0, len(order), group_size):
+        group = order[first:first + group_size]
+        stretched = _wsola_group([signals[i] for i in group], [rates[i] for i in group], hop, tolerance, window)
+        for i, signal in zip(group, stretched):
+            results[i] = signal
+    return results
+
+def _wsola_group(signals, rates, hop, tolerance, window):
+    """Run WSOLA on a group of signals in lockstep, one vectorized step per output frame"""
+    frame = 2 * hop
+    rates = np.asarray(rates, dtype=np.float64)
+    lengths = np.array([len(signal) for signal in signals])
+    out_lengths = np.round(lengths / rates).astype(int)
+    n_frames = int(np.max(np.ceil(out_lengths / hop))) + 1
+
+    # Pad every signal into one matrix with room for the search tolerance on both sides
+    pad = tolerance + frame
+    width = int(np.max(np.ceil(n_frames * hop * rates))) + 2 * pad + frame
+    padded = np.zeros((len(signals), width), dtype=np.float32)
+    for i, signal in enumerate(signals):
+        padded[i, pad:pad + len(signal)] = signal
+    halves = sliding_window_view(padded, hop, axis=1)
+    regions = sliding_window_view(padded, 2 * tolerance + hop, axis=1)
+    frames = sliding_window_view(padded, frame, axis=1)
+    # Long enough that circular correlation over the search lags never wraps around
+    n_fft = 1 << int(np.ceil(np.log2(2 * tolerance + hop)))
+
+    rows = np.arange(len(signals))
+    positions = np.zeros((len(signals), n_frames), dtype=np.int64)
+    positions[:, 0] = pad
+    for k in range(1, n_frames):
+        # The natural continuation of the previous frame is what the overlap should match
+        target = halves[rows, positions[:, k - 1] + hop]
+        start = np.round(k * hop * rates).astype(np.int64) + pad - tolerance
+        # Cross-correlate against every offset in the search region at once via the FFT
+        spectrum = np.fft.rfft(regions[rows, start], n_fft) * np.conj(np.fft.rfft(target, n_fft))
+        similarity = np.fft.irfft(spectrum, n_fft)[:, :2 * tolerance + 1]
+        positions[:, k] = start + np.argmax(similarity, axis=1)
+
+    # Overlap-add all chosen frames in one vectorized step
+    chosen = frames[rows[:, None], positions] * window
+    output = np.zeros((len(signals), n_frames + 1, hop), dtype=np.float32)
+    output[:, :-1] += chosen[:, :, :hop]
+    output[:, 1:] += chosen[:, :, hop:]
+    output = output.reshape(len(signals), -1)
+
+    return [output[i, :out_lengths[i]].copy() for i in range(len(signals))]
+
+def time_stretch(signal, rate, sample_rate=24000, frame_ms=30, tolerance_ms=8):
+    """Pitch-preserving time-stretch of a single mono signal, see time_stretch_batch"""
+    return time_stretch_batch([signal], [rate], sample_rate, frame_ms, tolerance_ms)[0]
+
+def fit_to_length(signal, target_length, sample_rate=24000, min_rate=0.5, max_rate=2.0):
+    """
+    Stretch or compress a mono signal to target_length samples, within the given speed bounds.
+    Whatever the bounds leave over is trimmed or padded with silence.
+    """
+    return fit_batch_to_lengths([signal], [target_length], sample_rate, min_rate, max_rate)[0]
+
+def fit_batch_to_lengths(signals, target_lengths, sample_rate=24000, min_rate=0.5, max_rate=2.0):
+    """Batch version of fit_to_length"""
+    results = [None] * len(signals)
+    to_stretch, rates = [], []
+    for i, (signal, target_length) in enumerate(zip(signals, target_lengths)):
+        if len(signal) == 0 or target_length <= 0:
+            results[i] = np.zeros(max(target_length, 0), dtype=np.float32)
+            continue
+        rate = min(max_rate, max(min_rate, len(signal) / target_length))
+        if abs(rate - 1.0) < 1e-3:
+            results[i] = np.asarray(signal, dtype=np.float32)
+        else:
+            to_stretch.append(i)
+            rates.append(rate)
+
+    stretched = time_stretch_batch([signals[i] for i in to_stretch], rates, sample_rate)
+    for i, signal in zip(to_stretch, stretched):
+        results[i] = signal
+
+    for i, target_length in enumerate(target_lengths):
+        signal = results[i][:target_length]
+        if len(signal) < target_length:
+            signal = np.pad(signal, (0, target_length - len(signal)))
+        results[i] = signal
+    return results
@@ -1,10 +1,15 @@
 import json
+import multiprocessing
 import os
 import wave
-from typing import Dict, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple, Union
 import numpy as np
-import torch
-import whisper
+from audio_buffer import AudioBuffer
+import media
+from segments import words_from_whisper, write_segments
+from transcription_engines import SAMPLE_RATE as WHISPER_SAMPLE_RATE, TranscriptionEngine, WhisperEngine, get_engine
+import perf
 
 def read_wav_file(file_path: str) -> Tuple[np.ndarray, int]:
     """Read a WAV file and return audio data and sample rate"""
@@ -14,65 +19,221 @@ def read_wav_file(file_path: str) -> Tuple[np.ndarray, int]:
         audio_data = np.frombuffer(wf.readframes(frames), dtype=np.int16).astype(np.float32) / 32768.0
         return audio_data, rate
 
-def transcribe_with_local_whisper(audio_file: str, model_size: str = "small") -> List[Dict]:
-    """Transcribe audio using local Whisper model with timestamps"""
-    print(f"Transcribing {audio_file} with Whisper {model_size} model...")
-    
-    # Check if CUDA is available
-    device = "cuda" if torch.cuda.is_available() else "cpu"
-    print(f"Using device: {device}")
-    
-    # Load the Whisper model
-    model = whisper.load_model(model_size, device=device)
+def resolve_engine(model_size: str = "small", model=None, engine: TranscriptionEngine = None) -> TranscriptionEngine:
+    """The engine to transcribe with: engine if given, else openai-whisper (using model if already loaded)"""
+    return engine or WhisperEngine(model_size, model=model)
+
+@perf.instrument("transcribe_with_local_whisper")
+def transcribe_with_local_whisper(audio_file: Union[str, AudioBuffer], model_size: str = "small", model=None,
+                                  engine: TranscriptionEngine = None) -> List[Dict]:
+    """
+    Transcribe audio (a file path or an in-memory AudioBuffer) using local Whisper model with timestamps.
+    Pass an already loaded model to skip loading one, or an engine to use another backend.
+    """
+    engine = resolve_engine(model_size, model, engine)
+    source = audio_file if isinstance(audio_file, str) else "in-memory audio"
+    print(f"Transcribing {source} with {engine.name} {engine.model_size} model...")
     
     # Transcribe the audio
     print("Running transcription...")
-    result = model.transcribe(
-        audio_file, 
-        verbose=True,   # Show progress
-        word_timestamps=True  # Enable word-level timestamps
-    )
-    
     # Format segments to match our expected structure
+    return [{
+        "text": segment["text"],
+        "timestamp": [segment["start"], segment["end"]],
+        "words": words_from_whisper(segment)
+    } for segment in engine.transcribe(load_whisper_audio(audio_file))]
+
+def load_whisper_audio(audio: Union[str, AudioBuffer]) -> np.ndarray:
+    """Decode a file path or AudioBuffer to the 16 kHz mono float32 array Whisper works on"""
+    if isinstance(audio, AudioBuffer):
+        return audio.to_mono().resample(WHISPER_SAMPLE_RATE).samples[0].astype(np.float32)
+    return media.decode_audio(audio, WHISPER_SAMPLE_RATE, 1).samples[0]
+
+def find_quiet_point(samples: np.ndarray, start: int, end: int, frame: int = WHISPER_SAMPLE_RATE // 50) -> int:
+    """Index of the quietest 20 ms frame in samples[start:end], a good place to cut between words"""
+    region = samples[start:end]
+    n_frames = len(region) // frame
+    if n_frames == 0:
+        return end
+    energy = (region[:n_frames * frame].reshape(n_frames, frame) ** 2).sum(axis=1)
+    return start + int(np.argmin(energy)) * frame
+
+def iter_transcription(audio_file: Union[str, AudioBuffer], model_size: str = "small", model=None,
+                       chunk_seconds: float = 30, search_seconds: float = 5,
+                       engine: TranscriptionEngine = None) -> Iterator[Dict]:
+    """
+    Transcribe audio chunk by chunk, yielding segments as soon as each chunk is decoded.
+    Chunks are about chunk_seconds long and cut at the quietest point in their last
+    search_seconds so words aren't split. The previous chunk's text is passed as the
+    prompt to keep context across chunks. Segments have the same shape as
+    transcribe_with_local_whisper's, with timestamps on the global timeline.
+    """
+    engine = resolve_engine(model_size, model, engine)
+    samples = load_whisper_audio(audio_file)
+    chunk = int(chunk_seconds * WHISPER_SAMPLE_RATE)
+    search = int(search_seconds * WHISPER_SAMPLE_RATE)
+
+    start = 0
+    previous_text = None
+    while start < len(samples):
+        end = len(samples)
+        if end - start > chunk:
+            end = find_quiet_point(samples, start + chunk - search, start + chunk)
+        offset = start / WHISPER_SAMPLE_RATE
+
+        window_segments = engine.transcribe(samples[start:end], initial_prompt=previous_text)
+        for segment in window_segments:
+            yield {
+                "text": segment["text"],
+                "timestamp": [segment["start"] + offset, segment["end"] + offset],
+                "words": words_from_whisper(segment, offset)
+            }
+        previous_text = "".join(segment["text"] for segment in window_segments) or None
+        start = end
+
+def detect_speech_regions(samples: np.ndarray, frame_ms: int = 30, threshold_db: float = -35,
+                          floor_db: float = -60, min_silence: float = 0.6, min_speech: float = 0.2,
+                          pad: float = 0.2) -> List[Tuple[int, int]]:
+    """
+    Energy-based voice activity detection for isolated vocals.
+    A frame is speech when its level is within threshold_db of the loudest frame (and above
+    floor_db). Gaps shorter than min_silence seconds are bridged, blips shorter than
+    min_speech are dropped and every region is padded by pad seconds.
+    Returns (start, end) sample indices.
+    """
+    frame = WHISPER_SAMPLE_RATE * frame_ms // 1000
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        return []
+    rms = np.sqrt((samples[:n_frames * frame].reshape(n_frames, frame) ** 2).mean(axis=1))
+    level = 20 * np.log10(rms + 1e-10)
+    voiced = level > max(level.max() + threshold_db, floor_db)
+
+    # Edges of runs of voiced frames
+    edges = np.diff(np.concatenate([[0], voiced.astype(np.int8), [0]]))
+    starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+    regions = []
+    for start, end in zip(starts * frame, ends * frame):
+        if regions and start - regions[-1][1] < min_silence * WHISPER_SAMPLE_RATE:
+            regions[-1][1] = end
+        else:
+            regions.append([start, end])
+    padding = int(pad * WHISPER_SAMPLE_RATE)
+    return [(max(0, start - padding), min(len(samples), end + padding))
+            for start, end in regions if end - start >= min_speech * WHISPER_SAMPLE_RATE]
+
+def pack_regions(samples: np.ndarray, regions: List[Tuple[int, int]], max_seconds: float = 30,
+                 search_seconds: float = 5) -> List[Tuple[int, int]]:
+    """
+    Group speech regions into windows of at most max_seconds, Whisper's native window.
+    Short silences inside a window cost nothing extra, while silences between windows are
+    skipped. Regions longer than a window are cut at their quietest point.
+    """
+    limit = int(max_seconds * WHISPER_SAMPLE_RATE)
+    search = int(search_seconds * WHISPER_SAMPLE_RATE)
+    pieces = []
+    for start, end in regions:
+        while end - start > limit:
+            cut = find_quiet_point(samples, start + limit - search, start + limit)
+            pieces.append((start, cut))
+            start = cut
+        pieces.append((start, end))
+
+    windows = []
+    for start, end in pieces:
+        if windows and end - windows[-1][0] <= limit:
+            windows[-1] = (windows[-1][0], end)
+        else:
+            windows.append((start, end))
+    return windows
+
+# Engine loaded once per worker process
+_worker_engine = None
+
+def _init_worker(spec: Dict, threads: int):
+    global _worker_engine
+    _worker_engine = get_engine(**{**spec, "threads": spec.get("threads") or threads}).load()
+
+def _transcribe_windows(windows: List[np.ndarray], offsets: List[float], engine: TranscriptionEngine = None) -> List[Dict]:
+    """Transcribe a batch of windows and shift their segments onto the global timeline"""
+    results = (engine or _worker_engine).transcribe_batch(windows)
     segments = []
-    for segment in result.get("segments", []):
-        segments.append({
+    for samples, offset, window_segments in zip(windows, offsets, results):
+        end = offset + len(samples) / WHISPER_SAMPLE_RATE
+        segments.extend({
             "text": segment["text"],
-            "timestamp": [segment["start"], segment["end"]]
-        })
-    
-    # If no segments are returned, fall back to full text
-    if not segments and "text" in result:
-        segments.append({
-            "text": result["text"],
-            "timestamp": [0.0, 30.0]
-        })
-    
+            "timestamp": [segment["start"] + offset, min(segment["end"] + offset, end)],
+            "words": words_from_whisper(segment, offset)
+        } for segment in window_segments)
     return segments
 
+@perf.instrument("transcribe_with_local_whisper")
+def transcribe_parallel(audio_file: Union[str, AudioBuffer], model_size: str = "small", workers: int = None,
+                        max_window_seconds: float = 30, model=None, engine: TranscriptionEngine = None) -> List[Dict]:
+    """
+    Transcribe only the speech in isolated vocals, with windows spread over worker processes.
+    Speech regions found by detect_speech_regions are packed into windows of up to
+    max_window_seconds, each window is transcribed independently and the timestamps are
+    shifted back onto the global timeline. Windows go to the engine engine.batch_size at a
+    time. Each worker builds its own copy of the engine and, unless the engine sets its
+    threads, gets an equal share of the cores. workers=1 (the default on GPU) transcribes
+    in this process. Returns segments in the same shape as transcribe_with_local_whisper.
+    """
+    engine = resolve_engine(model_size, model, engine)
+    cpus = os.cpu_count() or 1
+    if workers is None:
+        workers = 1 if engine.uses_gpu() else max(1, min(4, cpus // 2))
+
+    samples = load_whisper_audio(audio_file)
+    windows = pack_regions(samples, detect_speech_regions(samples), max_window_seconds)
+    speech = sum(end - start for start, end in windows) / WHISPER_SAMPLE_RATE
+    print(f"Transcribing {speech:.0f}s of speech in {len(windows)} windows "
+          f"({len(samples) / WHISPER_SAMPLE_RATE:.0f}s total) with {engine.name} and {workers} worker(s)...")
+    if not windows:
+        return []
+
+    batch = max(1, engine.batch_size)
+    jobs = [([samples[start:end] for start, end in windows[i:i + batch]],
+             [start / WHISPER_SAMPLE_RATE for start, _ in windows[i:i + batch]])
+            for i in range(0, len(windows), batch)]
+    workers = min(workers, len(jobs))
+    if workers <= 1:
+        engine.load()
+        results = [_transcribe_windows(batch_windows, offsets, engine) for batch_windows, offsets in jobs]
+    else:
+        # Spawned rather than forked: forking after torch has started its thread pools can hang
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(engine.spec(), max(1, cpus // workers))) as executor:
+            results = list(executor.map(_transcribe_windows, *zip(*jobs)))
+    return [segment for batch_segments in results for segment in batch_segments]
+
+def to_store_segment(segment: Dict) -> Dict:
+    """A transcription segment as a segment store record"""
+    return {
+        "start": segment["timestamp"][0],
+        "end": segment["timestamp"][1],
+        "text": segment["text"].strip(),
+        "words": segment.get("words") or None,
+    }
+
 def save_transcription(segments: List[Dict], output_file: str):
-    """Save transcription with timestamps to file"""
+    """Save transcription with timestamps to a segment store (.jsonl) or a plain JSON dump (.json)"""
     file_extension = os.path.splitext(output_file)[1].lower()
     
     if file_extension == '.json':
         with open(output_file, 'w') as f:
             json.dump(segments, f, indent=2)
-    elif file_extension == '.txt':
-        with open(output_file, 'w') as f:
-            for segment in segments:
-                start = segment['timestamp'][0]
-                end = segment['timestamp'][1]
-                text = segment['text']
-                # Add four spaces after timestamp to match your desired format
-                f.write(f"[{start:.2f} - {end:.2f}]    {text}\n")
+    elif file_extension == '.jsonl':
+        write_segments(output_file, (to_store_segment(segment) for segment in segments), "transcript")
     else:
-        raise ValueError("Unsupported file extension. Use .json or .txt")
+        raise ValueError("Unsupported file extension. Use .jsonl or .json")
     
     print(f"Transcription saved to {output_file}")
 
 # if __name__ == "__main__":
 #     audio_file = "tempfile/aud/vocals.wav"
-#     output_file = "tempfile/transcription.txt"
+#     output_file = "tempfile/transcription.jsonl"
     
 #     # Choose model size: 'tiny', 'base', 'small', 'medium', or 'large'
 #     model_size = "small"  # Smaller models are faster but less accurate
@@ -0,0 +1,185 @@
+"""
+Interchangeable speech-to-text backends for the transcription stage.
+
+Every engine returns Whisper-style segments, {"start", "end", "text", "words"} with
+words as [{"start", "end", "word"}], so transcribe.py and the segment store don't
+care which one ran:
+
+- "whisper": openai-whisper in full precision, the reference backend
+- "whisper-int8": the same model with its linear layers dynamically quantized to
+  int8 on the CPU (plain PyTorch, no extra dependency)
+- "faster-whisper": CTranslate2 through faster-whisper, int8 on the CPU by default
+"""
+import numpy as np
+
+# Whisper works on 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+class TranscriptionEngine:
+    """
+    Interface for the speech-to-text model used by the transcription stage.
+    Subclasses implement _load() and transcribe(); models are loaded on first use.
+    threads caps the CPU threads the model uses (None for the backend's default),
+    beam_size > 1 turns on beam search and batch_size is how many speech windows
+    transcribe_batch() decodes together on backends that can batch.
+    """
+    name = "base"
+
+    def __init__(self, model_size="small", threads=None, beam_size=1, batch_size=1, model=None):
+        self.model_size = model_size
+        self.threads = threads
+        self.beam_size = beam_size
+        self.batch_size = batch_size
+        self.model = model
+
+    def spec(self):
+        """What to build the same engine from in another process, see get_engine()"""
+        return {"name": self.name, "model_size": self.model_size, "threads": self.threads,
+                "beam_size": self.beam_size, "batch_size": self.batch_size}
+
+    def uses_gpu(self):
+        return False
+
+    def load(self):
+        if self.model is None:
+            self.model = self._load()
+        return self
+
+    def _load(self):
+        raise NotImplementedError
+
+    def transcribe(self, samples, initial_prompt=None, condition_on_previous_text=True):
+        """Transcribe 16 kHz mono float32 samples; returns segments timed from the start of samples"""
+        raise NotImplementedError
+
+    def transcribe_batch(self, windows):
+        """Transcribe independent speech windows; returns one list of segments per window"""
+        return [self.transcribe(window, condition_on_previous_text=False) for window in windows]
+
+class WhisperEngine(TranscriptionEngine):
+    """openai-whisper on the best available device (fp16 on a GPU, fp32 on the CPU). It can't batch."""
+    name = "whisper"
+
+    def _device(self):
+        import torch
+
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def uses_gpu(self):
+        return self._device() == "cuda"
+
+    def _load(self):
+        import torch
+        import whisper
+
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        device = self._device()
+        print(f"Loading Whisper {self.model_size} ({self.name}) on {device}")
+        return whisper.load_model(self.model_size, device=device)
+
+    def transcribe(self, samples, initial_prompt=None, condition_on_previous_text=True):
+        self.load()
+        result = self.model.transcribe(
+            samples,
+            word_timestamps=True,
+            initial_prompt=initial_prompt,
+            condition_on_previous_text=condition_on_previous_text,
+            # openai-whisper decodes greedily when no beam size is given
+            beam_size=self.beam_size if self.beam_size > 1 else None,
+            fp16=self.model.device.type == "cuda",
+        )
+        return result.get("segments", [])
+
+class WhisperInt8Engine(WhisperEngine):
+    """
+    openai-whisper with int8 dynamically quantized linear layers, CPU only.
+    Weights are stored as int8 and activations quantized on the fly, which roughly
+    halves the time spent in the encoder and decoder matmuls on x86 and ARM.
+    """
+    name = "whisper-int8"
+
+    def _device(self):
+        return "cpu"
+
+    def _load(self):
+        import torch
+        import whisper.model
+
+        model = super()._load()
+        # Whisper's Linear subclass only adds dtype casting for fp16; turn its layers back
+        # into plain nn.Linear so the quantizer recognises them
+        for module in model.modules():
+            if type(module) is whisper.model.Linear:
+                module.__class__ = torch.nn.Linear
+        return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """
+    faster-whisper (CTranslate2). compute_type "int8" runs quantized on the CPU;
+    with batch_size > 1 windows are decoded together by its batched pipeline.
+    """
+    name = "faster-whisper"
+
+    def __init__(self, model_size="small", threads=None, beam_size=1, batch_size=1, model=None,
+                 compute_type="int8", device="cpu"):
+        super().__init__(model_size, threads, beam_size, batch_size, model)
+        self.compute_type = compute_type
+        self.device = device
+
+    def spec(self):
+        return {**super().spec(), "compute_type": self.compute_type, "device": self.device}
+
+    def uses_gpu(self):
+        return self.device != "cpu"
+
+    def _load(self):
+        from faster_whisper import WhisperModel
+
+        print(f"Loading faster-whisper {self.model_size} ({self.compute_type}) on {self.device}")
+        return WhisperModel(self.model_size, device=self.device, compute_type=self.compute_type,
+                            cpu_threads=self.threads or 0)
+
+    @staticmethod
+    def _to_dicts(segments, offset=0.0):
+        return [{
+            "start": segment.start - offset,
+            "end": segment.end - offset,
+            "text": segment.text,
+            "words": [{"start": word.start - offset, "end": word.end - offset, "word": word.word}
+                      for word in segment.words or []],
+        } for segment in segments]
+
+    def transcribe(self, samples, initial_prompt=None, condition_on_previous_text=True):
+        self.load()
+        segments, _ = self.model.transcribe(samples, beam_size=self.beam_size, word_timestamps=True,
+                                            initial_prompt=initial_prompt,
+                                            condition_on_previous_text=condition_on_previous_text)
+        # segments is a generator; decoding happens while it is consumed
+        return self._to_dicts(segments)
+
+    def transcribe_batch(self, windows):
+        if self.batch_size <= 1 or len(windows) <= 1:
+            return super().transcribe_batch(windows)
+        from faster_whisper import BatchedInferencePipeline
+
+        self.load()
+        # Lay the windows end to end and let the pipeline cut them back out by clip timestamps
+        starts = np.cumsum([0] + [len(window) for window in windows]) / SAMPLE_RATE
+        clips = [{"start": start, "end": end} for start, end in zip(starts[:-1], starts[1:])]
+        segments, _ = BatchedInferencePipeline(self.model).transcribe(
+            np.concatenate(windows), batch_size=self.batch_size, beam_size=self.beam_size,
+            word_timestamps=True, vad_filter=False, clip_timestamps=clips)
+        results = [[] for _ in windows]
+        for segment in segments:
+            i = min(max(int(np.searchsorted(starts, segment.start, side="right")) - 1, 0), len(windows) - 1)
+            results[i].extend(self._to_dicts([segment], starts[i]))
+        return results
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine, WhisperInt8Engine, FasterWhisperEngine)}
+
+def get_engine(name="whisper", model_size="small", **options):
+    """Build a transcription engine by name, e.g. get_engine("faster-whisper", "medium", threads=4)"""
+    if name not in ENGINES:
+        raise ValueError(f"Unknown transcription engine '{name}'; choose from {', '.join(ENGINES)}")
+    return ENGINES[name](model_size, **options)
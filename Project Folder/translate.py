@@ -1,88 +1,197 @@
 import re
-import google.generativeai as genai
 import os
-from dotenv import load_dotenv
+import time
+from concurrent.futures import ThreadPoolExecutor
+from translation_backends import GeminiBackend
+from segments import iter_segments, write_segments
+import perf
 
-def parse_transcript(transcript_file):
-    """
-    Format: [start_time - end_time] text
-    """
-    segments = []
-    with open(transcript_file, 'r') as file:
-        for line in file:
-            # Skip empty lines or file path comments
-            if not line.strip() or line.strip().startswith('//'):
-                continue
-                
-            # Parse timestamp and text
-            match = re.match(r'\[([\d.]+) - ([\d.]+)\]\s+(.*)', line)
-            if match:
-                start_time = float(match.group(1))
-                end_time = float(match.group(2))
-                text = match.group(3).strip()
-                segments.append({
-                    'start_time': start_time,
-                    'end_time': end_time,
-                    'text': text
-                })
-    
-    return segments
-
-def translate_text(text, target_language, model):
+# Bump whenever the translation prompts change so cached translations are not reused
+PROMPT_VERSION = 1
+
+def translate_text(text, target_language, backend):
     prompt = f"Translate the following English text to {target_language}. Keep the same meaning, tone and spoken style:\n\n{text}.\n\nOnly return the translated text, no options or any other text needed."
-    
+
     try:
-        response = model.generate_content(prompt)
-        return response.text
+        start = time.perf_counter()
+        translation = backend.generate(prompt)
+        perf.record_latency("translation_segment", time.perf_counter() - start)
+        return translation
     except Exception as e:
         print(f"Translation error: {e}")
         return text  # Return original text if translation fails
 
-def translate_transcript(transcript_file, target_language):
+def make_batches(segments, max_chars=3000, max_segments=40):
+    """
+    Group (id, text) pairs into batches whose combined text stays under max_chars
+    (roughly 4 characters per token) and max_segments lines.
+    """
+    batches = []
+    current, current_chars = [], 0
+    for segment_id, text in segments:
+        if current and (current_chars + len(text) > max_chars or len(current) >= max_segments):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append((segment_id, text))
+        current_chars += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+def build_batch_prompt(batch, target_language):
+    lines = "\n".join(f"<{segment_id}> {text}" for segment_id, text in batch)
+    return (
+        f"Translate each numbered English line below to {target_language}. "
+        "The lines are consecutive parts of one transcript, so use them as context for each other. "
+        "Keep the same meaning, tone and spoken style.\n"
+        "Reply with exactly one line per input line, starting with the same <number> tag, "
+        "and nothing else.\n\n"
+        f"{lines}"
+    )
+
+def parse_batch_response(response, batch):
+    """Map each segment id in batch to its translation; ids missing from the response are left out"""
+    expected = {segment_id for segment_id, _ in batch}
+    translations = {}
+    for line in response.splitlines():
+        match = re.match(r'\s*<(\d+)>\s*(.*)', line)
+        if not match:
+            continue
+        segment_id, text = int(match.group(1)), match.group(2).strip()
+        if segment_id in expected and text and segment_id not in translations:
+            translations[segment_id] = text
+    return translations
+
+def translate_batch(batch, target_language, backend):
     """
-    Translate a transcript file to the specified language and save the result
+    Translate a batch of (id, text) pairs in a single request.
+    Segments missing or empty in the reply are retried one at a time.
     """
-    # Load environment variables for API keys
-    load_dotenv()
-    
-    # Configure Gemini AI
     try:
-        api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
-            raise ValueError("GOOGLE_API_KEY not found in environment variables")
-        
-        genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.0-flash')
+        start = time.perf_counter()
+        response = backend.generate(build_batch_prompt(batch, target_language))
+        elapsed = time.perf_counter() - start
+        perf.record_latency("translation_batch", elapsed)
+        # Every segment in the batch waited for the whole request
+        for _ in batch:
+            perf.record_latency("translation_segment", elapsed)
+        translations = parse_batch_response(response, batch)
     except Exception as e:
-        print(f"Error initializing Gemini: {e}")
-        return
-    
-    # Parse the transcript
-    segments = parse_transcript(transcript_file)
+        print(f"Batch translation error: {e}")
+        translations = {}
+
+    for segment_id, text in batch:
+        if segment_id not in translations:
+            translations[segment_id] = translate_text(text, target_language, backend).strip()
+    return translations
+
+def translate_segments(texts, target_language, backend, max_chars=3000, max_workers=4):
+    """Translate a list of texts in batches, running up to max_workers requests at once"""
+    batches = make_batches(list(enumerate(texts)), max_chars=max_chars)
+    translations = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(lambda batch: translate_batch(batch, target_language, backend), batches):
+            translations.update(result)
+    return [translations[i] for i in range(len(texts))]
+
+def translate_cached(texts, target_language, backend, cache=None, batched=True, max_chars=3000, max_workers=4):
+    """
+    Translate a list of texts, sending only cache misses to the backend.
+    Repeated texts within the list are translated once.
+    """
+    keys = [None] * len(texts)
+    results = [None] * len(texts)
+    if cache is not None:
+        keys = [cache.make_key(text, target_language, backend.model_name, PROMPT_VERSION) for text in texts]
+        results = cache.get_many(keys)
+
+    # Deduplicate the misses so each distinct text reaches the backend once
+    pending = {}
+    for i, text in enumerate(texts):
+        if results[i] is None:
+            pending.setdefault(text, []).append(i)
+    if not pending:
+        return results
+
+    unique_texts = list(pending)
+    if batched:
+        translated = translate_segments(unique_texts, target_language, backend, max_chars, max_workers)
+    else:
+        translated = [translate_text(text, target_language, backend) for text in unique_texts]
+
+    new_entries = []
+    for text, translation in zip(unique_texts, translated):
+        for i in pending[text]:
+            results[i] = translation
+        # A failed translation comes back as the source text; don't cache that
+        if translation.strip() != text.strip():
+            new_entries.append((keys[pending[text][0]], translation))
+    if cache is not None:
+        cache.put_many(new_entries)
+        cache.evict()
+    return results
+
+def translation_record(segment, target_language, translated_text):
+    """
+    The translation layer record for a transcript segment.
+    A translation identical to the source is what a failed request falls back to, so it is marked as such.
+    """
+    translated_text = translated_text.strip()
+    return {
+        'id': segment['id'],
+        'start': segment['start'],
+        'end': segment['end'],
+        'translations': {target_language: translated_text},
+        'status': {'translate': 'ok' if translated_text != segment['text'].strip() else 'fallback'},
+    }
+
+def save_translation(translated_segments, output_file, target_language):
+    """Write translation records to a segment store"""
+    write_segments(output_file, translated_segments, "translation", language=target_language)
+    print(f"Translation complete. Output saved to {output_file}")
+
+@perf.instrument("translate_transcript")
+def translate_transcript(transcript_file, target_language, backend=None, batched=True, max_chars=3000, max_workers=4, cache=None,
+                         output_file=None):
+    """
+    Translate a transcript segment store to the specified language and save the result
+    as a translation store (by default next to the transcript, suffixed with the language).
+    By default segments are packed into batched requests; pass batched=False
+    to translate one segment per request. With a TranslationCache, only lines
+    not translated before reach the backend.
+    """
+    # Configure Gemini AI unless another backend was given
+    if backend is None:
+        try:
+            backend = GeminiBackend()
+        except Exception as e:
+            print(f"Error initializing Gemini: {e}")
+            return
+
+    # Only the timings and text are needed, not the word timings
+    segments = list(iter_segments(transcript_file, fields=('start', 'end', 'text')))
     if not segments:
         print(f"No valid segments found in {transcript_file}")
         return
-    
-    # Translate each segment
-    translated_segments = []
-    for i, segment in enumerate(segments):
-        translated_text = translate_text(segment['text'], target_language, model)
-        translated_segments.append({
-            'start_time': segment['start_time'],
-            'end_time': segment['end_time'],
-            'text': translated_text
-        })
-    
+
+    # Translate the segments
+    texts = [segment['text'] for segment in segments]
+    translated_texts = translate_cached(texts, target_language, backend, cache, batched, max_chars, max_workers)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"Translation cache: {stats['hits']} hits, {stats['misses']} misses")
+
+    translated_segments = [translation_record(segment, target_language, translated_text)
+                           for segment, translated_text in zip(segments, translated_texts)]
+
     # Generate output filename
-    base_name = os.path.splitext(transcript_file)[0]
-    output_file = f"{base_name}_{target_language.lower().replace(' ', '_')}.txt"
-    
+    if output_file is None:
+        base_name = os.path.splitext(transcript_file)[0]
+        output_file = f"{base_name}_{target_language.lower().replace(' ', '_')}.jsonl"
+
     # Write translated transcript
-    with open(output_file, 'w') as file:
-        for segment in translated_segments:
-            file.write(f"[{segment['start_time']:.2f} - {segment['end_time']:.2f}]  {segment['text']}\n")
-    
-    print(f"Translation complete. Output saved to {output_file}")
+    save_translation(translated_segments, output_file, target_language)
+    return output_file
+
 
-    
-# translate_transcript("tempfile/transcription.txt", input("Enter the target language: "))
\ No newline at end of file
+# translate_transcript("tempfile/transcription.jsonl", input("Enter the target language: "))
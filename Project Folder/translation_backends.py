@@ -0,0 +1,31 @@
+import os
+
+class TranslationBackend:
+    """
+    Interface for the language model used by the translation stage.
+    Subclasses implement generate(), which takes a prompt and returns the model's text reply.
+    """
+    model_name = "base"
+
+    def generate(self, prompt):
+        raise NotImplementedError
+
+class GeminiBackend(TranslationBackend):
+    """Google Gemini through google-generativeai"""
+
+    def __init__(self, model_name='gemini-2.0-flash', api_key=None):
+        import google.generativeai as genai
+        from dotenv import load_dotenv
+
+        # Load environment variables for API keys
+        load_dotenv()
+        api_key = api_key or os.environ.get("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY not found in environment variables")
+
+        genai.configure(api_key=api_key)
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(model_name)
+
+    def generate(self, prompt):
+        return self.model.generate_content(prompt).text
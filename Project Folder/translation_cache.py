@@ -0,0 +1,113 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import unicodedata
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dubai", "translations.sqlite")
+
+def normalize_text(text):
+    """Normalize source text so trivial whitespace/Unicode differences share a cache entry"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+class TranslationCache:
+    """
+    Persistent SQLite cache of translated segments.
+    Entries are keyed by a hash of the normalized source text, target language,
+    model name and prompt version, and evicted least-recently-used once the
+    stored text exceeds max_bytes. Lookups and stores for a whole run go through
+    get_many/put_many, one transaction each; the size is tracked as entries are
+    written and evict() only touches the table once the cache is over budget.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=64 * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, translation TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS translations_last_used ON translations (last_used)")
+        self._conn.commit()
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+
+    @staticmethod
+    def make_key(text, target_language, model_name, prompt_version):
+        raw = "\0".join([str(prompt_version), model_name, target_language.lower(), normalize_text(text)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _lookup(self, columns, keys):
+        """Rows (key, *columns) for the given keys, queried a few hundred keys at a time"""
+        rows = {}
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            query = f"SELECT key, {columns} FROM translations WHERE key IN ({','.join('?' * len(chunk))})"
+            rows.update((row[0], row[1]) for row in self._conn.execute(query, chunk))
+        return rows
+
+    def get_many(self, keys):
+        """Cached translations for keys (None where missing), marking the hits as used in one transaction"""
+        with self._lock:
+            found = self._lookup("translation", list(set(keys)))
+            self.hits += sum(key in found for key in keys)
+            self.misses += sum(key not in found for key in keys)
+            if found:
+                now = time.time()
+                self._conn.executemany("UPDATE translations SET last_used = ? WHERE key = ?",
+                                       [(now, key) for key in found])
+                self._conn.commit()
+        return [found.get(key) for key in keys]
+
+    def get(self, key):
+        """Return the cached translation for key, or None"""
+        return self.get_many([key])[0]
+
+    def put_many(self, items):
+        """Store (key, translation) pairs in one transaction"""
+        items = dict(items)
+        if not items:
+            return
+        with self._lock:
+            replaced = self._lookup("size", list(items))
+            now = time.time()
+            rows = [(key, translation, len(translation.encode("utf-8")), now) for key, translation in items.items()]
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO translations (key, translation, size, last_used) VALUES (?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self._total += sum(size for _, _, size, _ in rows) - sum(replaced.values())
+
+    def put(self, key, translation):
+        self.put_many([(key, translation)])
+
+    def evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes; call once per run"""
+        with self._lock:
+            if self._total <= self.max_bytes:
+                return
+            # Other processes may share the file, so count for real before deleting
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM translations").fetchone()[0]
+            doomed = []
+            for key, size in self._conn.execute("SELECT key, size FROM translations ORDER BY last_used"):
+                if total <= self.max_bytes:
+                    break
+                doomed.append((key,))
+                total -= size
+            self._conn.executemany("DELETE FROM translations WHERE key = ?", doomed)
+            self._conn.commit()
+            self._total = total
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM translations").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def close(self):
+        self._conn.close()
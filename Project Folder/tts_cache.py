@@ -0,0 +1,90 @@
+import hashlib
+import os
+import tempfile
+import threading
+import numpy as np
+from audio_buffer import AudioBuffer
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "dubai", "tts")
+
+class TTSCache:
+    """
+    Content-addressed on-disk cache of synthesized speech.
+    Entries are keyed by (text, language, engine, voice) and stored as decoded
+    16-bit PCM, so a hit skips both synthesis and MP3 decoding. The least
+    recently used entries are evicted once the cache grows past max_bytes.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=1024 * 1024 * 1024):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(text, lang, engine_name, voice):
+        raw = "\0".join([engine_name, voice, lang.lower(), " ".join(text.split())])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], f"{key}.npz")
+
+    def get(self, key):
+        """Return the cached AudioBuffer for key, or None"""
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                pcm, sample_rate = data["pcm"], int(data["sample_rate"])
+            # Touch the entry so eviction sees it as recently used
+            os.utime(path)
+        except (FileNotFoundError, OSError, KeyError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return AudioBuffer(pcm.astype(np.float32) / 32768.0, sample_rate)
+
+    def put(self, key, audio):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pcm = (np.clip(audio.samples, -1.0, 1.0) * 32767).astype(np.int16)
+        # Write to a temporary file unique across threads and processes (batch jobs share the
+        # cache), so readers never see a partial entry and concurrent writers never share one
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, pcm=pcm, sample_rate=audio.sample_rate)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith(".npz"):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        # Evicted or replaced by another process meanwhile
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
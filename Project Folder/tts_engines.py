@@ -0,0 +1,32 @@
+from io import BytesIO
+
+class TTSEngine:
+    """
+    Interface for text-to-speech backends used by the dubbing stage.
+    Subclasses implement synthesize() and return the speech as a pydub AudioSegment.
+    """
+    name = "base"
+    voice = "default"
+
+    def synthesize(self, text, lang):
+        raise NotImplementedError
+
+class GTTSEngine(TTSEngine):
+    """Google Text-to-Speech, decoded in memory instead of through an MP3 file"""
+    name = "gtts"
+
+    def __init__(self, slow=False, tld="com"):
+        self.slow = slow
+        self.tld = tld
+        self.voice = f"{tld}{'-slow' if slow else ''}"
+
+    def synthesize(self, text, lang):
+        # Imported here so offline engines don't need gTTS installed, and building a
+        # pipeline (which only reads the engine's name and voice) stays light
+        from gtts import gTTS
+        from pydub import AudioSegment
+
+        fp = BytesIO()
+        gTTS(text=text, lang=lang, slow=self.slow, tld=self.tld).write_to_fp(fp)
+        fp.seek(0)
+        return AudioSegment.from_file(fp, format="mp3")